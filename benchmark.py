@@ -0,0 +1,370 @@
+"""
+北师大投票监控的性能测试
+
+在本机起一个模拟的投票网站（登录页带vm对象、投票统计按钮、任意数量的.info-item候选人、
+JSON数据接口），不用真账号、也不访问学校服务器，就能测各条采集路径的耗时。
+结果写成JSON，换个版本再跑一次对比就能看出有没有变慢。
+
+用法：
+    python benchmark.py                          # 默认 10/100/1000/10000 个候选人
+    python benchmark.py --sizes 10,1000 --repeat 3 --output before.json
+    python benchmark.py --skip-browser           # 没装Chrome时只测离线解析和HTTP轮询
+"""
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import platform
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SESSION_COOKIE = "bench_session"
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><title>统一身份认证登录</title></head>
+<body>
+<input type="text" id="username">
+<input type="password" id="password">
+<div class="btn" onclick="vm.username = document.getElementById('username').value || vm.username;
+                          vm.password = document.getElementById('password').value || vm.password;
+                          vm.login();">登录</div>
+<script>
+var vm = {
+    username: '',
+    password: '',
+    login: function () {
+        if (!this.username || !this.password) { alert('请输入用户名和密码'); return; }
+        document.cookie = '%(cookie)s=1; path=/';
+        location.href = %(service)s;
+    }
+};
+</script>
+</body></html>"""
+
+VOTE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><title>投票统计 - 模拟投票</title></head>
+<body>
+<button class="btn-statistics" onclick="showStatistics()">查看投票统计</button>
+<div class="list">%(items)s</div>
+<script>
+var VOTES = %(votes)s;
+function showStatistics() {
+    var nums = document.querySelectorAll('.info-item .vote-box .num');
+    for (var i = 0; i < nums.length; i++) {
+        nums[i].textContent = VOTES[i] + '票';
+    }
+}
+</script>
+</body></html>"""
+
+ITEM = ('<div class="info-item"><img src="/img/%(number)d.jpg">'
+        '<div class="detail"><p>%(number)d号 候选人%(number)d</p></div>'
+        '<div class="vote-box"><span class="num">%(num)s</span>'
+        '<div class="btn-vote">投票</div></div></div>')
+
+class FakeVoteSite:
+    """模拟投票网站：投票ID就是候选人数量，/site/vote/index?id=1000 有1000个候选人
+
+    churn为True时每次请求票数都会变化，为False时票数保持不变（用来测“没变化”的路径）。
+    """
+
+    def __init__(self):
+        self.churn = True
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def vote_counts(self, size):
+        with self.lock:
+            self.requests += 1
+            tick = self.requests if self.churn else 0
+        return [(number * 7919) % 5000 + tick for number in range(1, size + 1)]
+
+    def vote_page(self, size, rendered=False):
+        """投票页；rendered为True时票数直接写在HTML里（相当于点过统计按钮后的page_source）"""
+        votes = self.vote_counts(size)
+        items = "".join(ITEM % {'number': n, 'num': f"{v}票" if rendered else ""}
+                        for n, v in zip(range(1, size + 1), votes))
+        return VOTE_PAGE % {'items': items, 'votes': json.dumps(votes)}
+
+    def vote_json(self, size):
+        votes = self.vote_counts(size)
+        return json.dumps({'code': 0, 'data': [
+            {'name': f"{n}号 候选人{n}", 'votes': v, 'img': f"/img/{n}.jpg"}
+            for n, v in zip(range(1, size + 1), votes)
+        ]}, ensure_ascii=False)
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, body, content_type, status=200):
+                data = body.encode("utf-8")
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                logged_in = f"{SESSION_COOKIE}=1" in self.headers.get("Cookie", "")
+
+                if url.path == "/login":
+                    service = query.get("service", ["/"])[0]
+                    page = LOGIN_PAGE % {'cookie': SESSION_COOKIE, 'service': json.dumps(service)}
+                    return self.send_body(page, "text/html; charset=utf-8")
+                if url.path.startswith("/img/"):
+                    return self.send_body("", "image/jpeg")
+
+                size = int(query.get("id", ["10"])[0])
+                if not logged_in:
+                    self.send_response(302)
+                    self.send_header("Location", "/login?service=" + quote(self.path, safe=""))
+                    self.end_headers()
+                    return
+                if url.path == "/site/vote/index":
+                    return self.send_body(site.vote_page(size), "text/html; charset=utf-8")
+                if url.path == "/api/vote":
+                    return self.send_body(site.vote_json(size), "application/json; charset=utf-8")
+                self.send_error(404)
+
+        return Handler
+
+def measure(func, repeat, quiet=True):
+    """调用func repeat次，返回耗时统计和最后一次的返回值"""
+    durations = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if quiet:
+            with redirect_stdout(io.StringIO()):
+                value = func()
+        else:
+            value = func()
+        durations.append(time.perf_counter() - start)
+    return {
+        'runs': repeat,
+        'median': statistics.median(durations),
+        'mean': statistics.fmean(durations),
+        'min': min(durations),
+        'max': max(durations),
+    }, value
+
+def phase_means(timers):
+    """把多次采集的PhaseTimer按阶段名求平均"""
+    totals = {}
+    for timer in timers:
+        for name, duration, _ in timer.phases:
+            totals.setdefault(name, []).append(duration)
+    return {name: statistics.fmean(values) for name, values in totals.items()}
+
+class Benchmark:
+    def __init__(self, bnuvote, site, args):
+        self.bnuvote = bnuvote
+        self.site = site
+        self.args = args
+        self.results = []
+
+    def record(self, name, size, stats, **extra):
+        entry = {'name': name, 'candidates': size, **stats, **extra}
+        self.results.append(entry)
+        print(f"   {name:<28} {size:>6}个候选人  中位数 {stats['median'] * 1000:10.2f}ms")
+
+    def run_offline(self, size):
+        """不需要浏览器：HTML解析、JSON解析和统计分析"""
+        bnuvote = self.bnuvote
+        self.site.churn = False
+        html = self.site.vote_page(size, rendered=True)
+        payload = json.loads(self.site.vote_json(size))
+        vote_url = bnuvote.vote_url_for(size)
+
+        stats, candidates = measure(lambda: bnuvote.BNUVoteHTMLExtractor(html, vote_url).extract_candidate_data(),
+                                    self.args.repeat)
+        self.record("html_extractor", size, stats)
+        stats, _ = measure(lambda: bnuvote.parse_vote_json(payload, vote_url), self.args.repeat)
+        self.record("parse_vote_json", size, stats)
+        stats, _ = measure(lambda: bnuvote.analyze_vote_results(candidates), self.args.repeat)
+        self.record("analyze_vote_results", size, stats)
+
+    def run_http(self, size):
+        """HTTP轮询：票数有变化时完整解析，没变化时命中304"""
+        bnuvote = self.bnuvote
+        poller = bnuvote.VoteHTTPPoller(page_url=bnuvote.vote_url_for(size),
+                                        api_url=f"{self.site.base_url}/api/vote?id={{vote_id}}")
+        poller.session.cookies.set(SESSION_COOKIE, "1", domain="127.0.0.1", path="/")
+
+        self.site.churn = True
+        stats, _ = measure(poller.fetch, self.args.repeat)
+        self.record("http_poll_changed", size, stats)
+        self.site.churn = False
+        poller.fetch()
+        stats, _ = measure(poller.fetch, self.args.repeat)
+        self.record("http_poll_not_modified", size, stats)
+
+    def new_solver(self, persistent, vote_id=None):
+        with redirect_stdout(io.StringIO()):
+            return self.bnuvote.BNUVoteSolver(persistent=persistent, profile=self.args.profile,
+                                              session_file=None, login_stats_file=None,
+                                              locator_cache_file=None, vote_id=vote_id)
+
+    def solver_refresh(self, solver, size, repeat):
+        """多次refresh，返回耗时统计和各阶段平均耗时"""
+        timers = []
+        def refresh():
+            result = solver.refresh("bench", "bench", vote_id=size)
+            timers.append(solver.last_timings)
+            return result
+        stats, result = measure(refresh, repeat, quiet=not self.args.verbose)
+        return stats, result, phase_means(timers)
+
+    def run_browser(self, size):
+        """浏览器路径：冷启动登录、持久会话刷新（有/无变化、dom/html两种提取）、两种DOM提取方式"""
+        bnuvote = self.bnuvote
+        repeat = self.args.repeat
+
+        # 冷启动：启动Chrome、登录、点统计按钮、提取，每次都是新浏览器
+        self.site.churn = True
+        def cold_run():
+            solver = self.new_solver(persistent=False, vote_id=size)
+            result = solver.run("bench", "bench")
+            return result, solver.last_timings
+        timers = []
+        def cold():
+            result, timer = cold_run()
+            timers.append(timer)
+            return result
+        stats, result = measure(cold, max(1, repeat // 2), quiet=not self.args.verbose)
+        self.record("solver_cold_run", size, stats, phases=phase_means(timers), ok=bool(result))
+
+        solver = self.new_solver(persistent=True)
+        try:
+            with redirect_stdout(io.StringIO()):
+                solver.refresh("bench", "bench", vote_id=size)  # 先登录一次
+
+            for backend in ("dom", "html"):
+                bnuvote.EXTRACT_BACKEND = backend
+                self.site.churn = True
+                stats, result, phases = self.solver_refresh(solver, size, repeat)
+                self.record(f"solver_refresh_{backend}", size, stats, phases=phases, ok=bool(result))
+            bnuvote.EXTRACT_BACKEND = "dom"
+
+            self.site.churn = False
+            with redirect_stdout(io.StringIO()):
+                solver.refresh("bench", "bench", vote_id=size)
+            stats, result, phases = self.solver_refresh(solver, size, repeat)
+            self.record("solver_refresh_unchanged", size, stats, phases=phases, ok=bool(result))
+
+            # 在已经加载好的页面上单独测两种DOM提取方式
+            extractor = bnuvote.BNUVoteDataExtractor(solver.driver)
+            stats, _ = measure(extractor.extract_candidates_bulk, repeat)
+            self.record("extractor_bulk", size, stats)
+            if size <= self.args.per_element_limit:
+                stats, _ = measure(extractor.extract_candidates_per_element, max(1, repeat // 2))
+                self.record("extractor_per_element", size, stats)
+        finally:
+            with redirect_stdout(io.StringIO()):
+                solver.close()
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def chrome_available(bench):
+    try:
+        bench.new_solver(persistent=False).close()
+        return True
+    except Exception as e:
+        print(f"⚠️ 无法启动Chrome，跳过浏览器测试: {e}")
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description="北师大投票监控性能测试（本地模拟网站）")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="候选人数量，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果JSON文件")
+    parser.add_argument("--profile", default="lean", help="浏览器配置（BROWSER_PROFILES里的名字）")
+    parser.add_argument("--per-element-limit", type=int, default=1000,
+                        help="候选人超过这个数量时不测逐个元素提取（太慢）")
+    parser.add_argument("--skip-browser", action="store_true", help="不测需要Chrome的路径")
+    parser.add_argument("--verbose", action="store_true", help="显示采集过程的输出")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    output = os.path.abspath(args.output)
+
+    # 会话、登录记录、历史库等文件都写到临时目录，不影响正常使用的数据
+    sys.path.insert(0, SCRIPT_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="bnuvote_bench_"))
+    with redirect_stdout(io.StringIO()):
+        import bnuvote
+
+    site = FakeVoteSite().start()
+    bnuvote.VOTE_URL_TEMPLATE = f"{site.base_url}/site/vote/index?id={{vote_id}}"
+    bench = Benchmark(bnuvote, site, args)
+    browser = not args.skip_browser and chrome_available(bench)
+
+    print(f"🏁 模拟投票网站: {site.base_url}")
+    try:
+        for size in sizes:
+            print(f"\n📊 {size} 个候选人")
+            bench.run_offline(size)
+            bench.run_http(size)
+            if browser:
+                bench.run_browser(size)
+    finally:
+        site.stop()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': sizes,
+        'repeat': args.repeat,
+        'browser': browser,
+        'results': bench.results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,238 @@
+import os
 import time
 import json
-import pandas as pd
+import gzip
+import zlib
+import hashlib
+import queue
+import random
+import sqlite3
+import argparse
+import tempfile
 import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
-from flask import Flask, render_template_string, jsonify
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse, parse_qs
+from flask import Flask, Response, g, render_template_string, jsonify, request, stream_with_context
 
 try:
-    from selenium import webdriver
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.chrome.service import Service
-    from webdriver_manager.chrome import ChromeDriverManager
-    print("✅ 所有库导入成功！")
-except ImportError as e:
-    print(f"❌ 库导入失败: {e}")
-    print("请运行: pip install selenium webdriver-manager pandas flask")
-    exit(1)
+    import brotli
+except ImportError:
+    brotli = None  # 没有brotli时只提供gzip压缩
+
+# 采集和分析用的库（Selenium、webdriver-manager、requests、numpy）比较重，第一次用到时才加载；
+# 只提供网页的进程（--web-only）不会加载它们，也不需要安装
+webdriver = By = WebDriverWait = EC = Options = Service = ChromeDriverManager = None
+WebDriverException = TimeoutException = UnexpectedAlertPresentException = None
+requests = HTTPAdapter = None
+np = None
+_import_lock = threading.Lock()
+
+def load_selenium():
+    """加载浏览器采集用的库，缺库时提示安装命令并抛出ImportError"""
+    global webdriver, By, WebDriverWait, EC, Options, Service, ChromeDriverManager
+    global WebDriverException, TimeoutException, UnexpectedAlertPresentException
+    with _import_lock:
+        if webdriver is not None:
+            return
+        try:
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support.ui import WebDriverWait
+            from selenium.webdriver.support import expected_conditions as EC
+            from selenium.webdriver.chrome.options import Options
+            from selenium.webdriver.chrome.service import Service
+            from selenium.common.exceptions import WebDriverException, TimeoutException, UnexpectedAlertPresentException
+            from webdriver_manager.chrome import ChromeDriverManager
+            from selenium import webdriver  # 最后赋值，其他线程看到webdriver就说明都加载好了
+        except ImportError as e:
+            print(f"❌ 库导入失败: {e}")
+            print("请运行: pip install selenium webdriver-manager")
+            raise
+        print("✅ 浏览器相关库加载成功！")
+
+def load_requests():
+    """加载HTTP轮询用的requests，缺库时提示安装命令并抛出ImportError"""
+    global requests, HTTPAdapter
+    with _import_lock:
+        if requests is not None:
+            return
+        try:
+            from requests.adapters import HTTPAdapter
+            import requests
+        except ImportError as e:
+            print(f"❌ 库导入失败: {e}")
+            print("请运行: pip install requests")
+            raise
+
+def load_numpy():
+    """加载分析用的numpy，没装时返回None（跳过增速/差距/预测分析）"""
+    global np
+    with _import_lock:
+        if np is None:
+            try:
+                import numpy as np
+            except ImportError:
+                np = False  # 已经试过，没装
+    return np or None
+
+# 账号与投票页面配置
+USERNAME = "学号"
+PASSWORD = "密码"
+VOTE_URL_TEMPLATE = "https://onewechat.bnu.edu.cn/site/vote/index?id={vote_id}"
+# 同时监控的投票id，第一个作为首页默认显示的投票
+VOTE_IDS = [1503]
+# 各投票在页面上显示的标题，没写的显示"投票 + id"
+VOTE_TITLES = {1503: '第二十六届十佳大学生"最具人气奖"投票'}
+VOTE_URL = VOTE_URL_TEMPLATE.format(vote_id=VOTE_IDS[0])
+
+# 常驻浏览器的数量上限，所有投票共享登录会话，每个投票在浏览器里占一个标签页
+MAX_BROWSERS = 1
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 数据获取方式："browser" 每次刷新都用浏览器采集；
+# "http" 浏览器只负责登录，之后把cookies交给HTTP客户端直接请求数据
+POLL_MODE = "browser"
+# 投票数据接口地址（可以用{vote_id}占位），留空则从页面发出的XHR/fetch请求中自动发现
+VOTE_API_URL = None
+# HTTP轮询模式下的刷新间隔（秒）
+HTTP_POLL_INTERVAL = 10
+# HTTP请求拿不到投票数据（没找到可用的数据接口）时，改用常驻浏览器采集多久（秒）再重新试HTTP
+HTTP_FALLBACK_DURATION = 1800
+
+# 持久会话模式：浏览器常驻并保持登录，每次刷新只重新加载投票页面
+PERSISTENT_SESSION = True
+
+# 浏览器配置："default" 有界面的完整Chrome；
+# "lean" 无头模式，不加载图片/音视频/字体和第三方统计脚本，适合配置较低的监控机器
+BROWSER_PROFILE = "default"
+
+BROWSER_PROFILES = {
+    'default': {
+        'headless': False,
+        'window_size': '1400,900',
+        'extra_args': [],
+        'block_images': False,
+        'blocked_urls': [],
+    },
+    'lean': {
+        'headless': True,
+        'window_size': '800,600',
+        'extra_args': [
+            '--disable-extensions',
+            '--disable-sync',
+            '--disable-background-networking',
+            '--disable-component-update',
+            '--disable-default-apps',
+            '--disable-features=Translate,MediaRouter,OptimizationHints',
+            '--no-first-run',
+            '--mute-audio',
+        ],
+        # 候选人图片只需要读src属性，不需要真正下载
+        'block_images': True,
+        # 在网络层拦截的音视频、字体和统计脚本
+        'blocked_urls': [
+            '*.mp4', '*.webm', '*.mp3', '*.m4a',
+            '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+            '*hm.baidu.com*', '*cnzz.com*', '*google-analytics.com*', '*googletagmanager.com*',
+        ],
+    },
+}
+
+# 候选人数据提取方式："dom" 通过WebDriver读取页面元素；
+# "html" 取一次page_source后离线解析，浏览器只负责加载页面
+EXTRACT_BACKEND = "dom"
+
+# 登录会话（cookies + localStorage）保存位置，重启后直接复用，免去重新登录
+SESSION_FILE = "bnuvote_session.json"
+
+# 各登录方法的成功记录，下次优先使用上次成功的方法
+LOGIN_STATS_FILE = "bnuvote_login_stats.json"
+
+# 每个投票页面上成功点到"投票统计"按钮的定位方式，下次直接使用
+LOCATOR_CACHE_FILE = "bnuvote_locators.json"
+
+# 票数历史库（SQLite），设为None则不记录历史
+HISTORY_DB = "bnuvote_history.db"
+
+# 页面存档：每次采集到的原始页面压缩保存（内容相同只存一份），之后可以用 --replay 离线重放；
+# 设为None则不存档
+PAGE_ARCHIVE_DIR = None  # 例如 "bnuvote_pages"
+PAGE_ARCHIVE_BUDGET = 500 * 1024 * 1024  # 存档总大小上限（字节），超出时先删最久没再出现过的页面
+
+# 每次更新后保存最新数据，重启后页面先显示它（标记为过期）直到第一次采集完成；设为None则不保存
+SNAPSHOT_FILE = "bnuvote_snapshot_{vote_id}.json"
+
+# 各投票的截止时间，用于预测最终票数和临近截止时加快采集；没写的不做预测
+VOTE_DEADLINES = {}  # 例如 {1503: "2025-12-31 22:00:00"}
+
+# 自适应采集间隔（秒）：票数涨得快时缩短，长时间没变化时逐渐放慢
+# budget_per_hour 是所有投票合计每小时最多采集多少次，免得给学校服务器太大压力
+POLL_INTERVALS = {
+    'browser': {'initial': 300, 'min_interval': 60, 'max_interval': 900, 'budget_per_hour': 90},
+    'http': {'initial': HTTP_POLL_INTERVAL, 'min_interval': 5, 'max_interval': 120, 'budget_per_hour': 1200},
+}
+POLL_TARGET_VOTES = 20    # 希望每次采集大约能看到多少票的变化
+POLL_JITTER = 0.2         # 间隔随机浮动±20%，避免每次都在同一时刻请求
+POLL_MAX_BACKOFF = 1800   # 连续失败时重试间隔的上限
+
+# 保留最近多少个数据版本用于计算增量，客户端版本比这更旧时发送完整数据
+SNAPSHOT_VERSIONS = 16
+
+# SSE推送连接多久没有新数据时发送一次心跳（秒），防止被代理断开
+SSE_HEARTBEAT = 15
+
+# 历史趋势接口单条曲线最多返回的点数（服务端降采样）
+MAX_HISTORY_POINTS = 2000
+
+# 各步骤等待的上限（秒）：条件满足即继续，只有超时才会等满
+WAIT_TIMEOUTS = {
+    'page_ready': 15,         # 投票页/登录页加载完成
+    'login_form': 10,         # 登录表单（Vue实例vm或登录按钮）出现
+    'vm_data': 3,             # Vue数据绑定生效
+    'login_result': 15,       # 登录后跳转
+    'statistics_button': 10,  # 投票统计按钮出现
+    'statistics_loaded': 15,  # 投票统计数据渲染完成
+    'network_idle': 0.5,      # 多长时间没有新请求视为网络空闲
+}
+
+def vote_id_from_url(url):
+    """从投票页链接中取出id参数"""
+    return parse_qs(urlparse(url).query).get('id', [''])[0]
+
+def vote_url_for(vote_id):
+    return VOTE_URL_TEMPLATE.format(vote_id=vote_id)
+
+def load_json_file(path, default=None):
+    """读取JSON文件，文件不存在或损坏时返回默认值"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 读取 {path} 失败: {e}")
+        return default
+
+def save_json_file(path, data):
+    """原子写入JSON文件（先写临时文件再替换，避免写到一半被读到）
+    
+    每次写都用独立的临时文件，多个浏览器同时保存同一个文件时不会互相截断。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 # HTML模板（保持不变）
 HTML_TEMPLATE = '''
@@ -61,6 +276,21 @@ HTML_TEMPLATE = '''
             font-size: 1.2em;
             opacity: 0.9;
         }
+        .poll-nav {
+            margin-top: 15px;
+        }
+        .poll-nav a {
+            display: inline-block;
+            margin: 5px;
+            padding: 5px 12px;
+            border-radius: 15px;
+            color: white;
+            text-decoration: none;
+            background: rgba(255,255,255,0.15);
+        }
+        .poll-nav a.active {
+            background: #3498db;
+        }
         .stats-bar {
             background: #f8f9fa;
             padding: 20px;
@@ -90,6 +320,48 @@ HTML_TEMPLATE = '''
             color: #1976d2;
             font-weight: bold;
         }
+        .trend {
+            padding: 20px 30px 0;
+        }
+        .trend-header {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            flex-wrap: wrap;
+            margin-bottom: 10px;
+        }
+        .trend-header h2 {
+            color: #2c3e50;
+            font-size: 1.3em;
+        }
+        .trend-ranges button {
+            border: 1px solid #3498db;
+            background: white;
+            color: #3498db;
+            border-radius: 12px;
+            padding: 3px 10px;
+            margin-left: 5px;
+            cursor: pointer;
+        }
+        .trend-ranges button.active {
+            background: #3498db;
+            color: white;
+        }
+        #trendChart {
+            width: 100%;
+            height: 260px;
+            display: block;
+        }
+        .trend-legend {
+            text-align: center;
+            font-size: 0.9em;
+            color: #2c3e50;
+            margin-top: 5px;
+        }
+        .trend-legend span {
+            margin: 0 8px;
+            white-space: nowrap;
+        }
         .candidates-grid {
             display: grid;
             grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
@@ -103,6 +375,9 @@ HTML_TEMPLATE = '''
             box-shadow: 0 5px 15px rgba(0,0,0,0.1);
             border-left: 5px solid #3498db;
             transition: transform 0.3s ease, box-shadow 0.3s ease;
+            /* 屏幕外的卡片跳过布局和绘制 */
+            content-visibility: auto;
+            contain-intrinsic-size: auto 260px;
         }
         .candidate-card:hover {
             transform: translateY(-5px);
@@ -166,6 +441,19 @@ HTML_TEMPLATE = '''
             border-radius: 10px;
             transition: width 0.5s ease;
         }
+        .trend-info {
+            color: #7f8c8d;
+            font-size: 0.85em;
+            margin-bottom: 10px;
+        }
+        .trend-info:empty {
+            display: none;
+        }
+        .grid-more {
+            text-align: center;
+            padding: 0 0 30px;
+            color: #7f8c8d;
+        }
         .status-badge {
             display: inline-block;
             padding: 5px 10px;
@@ -205,7 +493,14 @@ HTML_TEMPLATE = '''
     <div class="container">
         <div class="header">
             <h1>🎓 北师大十佳大学生投票实时统计</h1>
-            <div class="subtitle">第二十六届十佳大学生"最具人气奖"投票</div>
+            <div class="subtitle">{{ title }}</div>
+            {% if polls|length > 1 %}
+            <div class="poll-nav">
+                {% for id, name in polls %}
+                <a href="/vote/{{ id }}" class="{{ 'active' if id == vote_id else '' }}">{{ name }}</a>
+                {% endfor %}
+            </div>
+            {% endif %}
         </div>
         
         <div class="stats-bar">
@@ -229,42 +524,93 @@ HTML_TEMPLATE = '''
         
         <div class="last-update">
             🕒 最后更新: <span id="updateTime">正在加载...</span>
+            <span id="dataAge"></span>
             <span id="refreshCountdown" style="margin-left: 20px;"></span>
         </div>
         
+        <div class="trend">
+            <div class="trend-header">
+                <h2>📈 票数趋势（前5名）</h2>
+                <div class="trend-ranges">
+                    <button data-range="3600">1小时</button>
+                    <button data-range="21600" class="active">6小时</button>
+                    <button data-range="86400">24小时</button>
+                    <button data-range="0">全部</button>
+                </div>
+            </div>
+            <canvas id="trendChart"></canvas>
+            <div class="trend-legend" id="trendLegend"></div>
+        </div>
+        
+        <div id="gridBefore"></div>
         <div class="candidates-grid" id="candidatesGrid">
             <!-- 候选人卡片将通过JavaScript动态生成 -->
-            <div style="text-align: center; padding: 40px; color: #7f8c8d;">
+            <div class="grid-placeholder" style="text-align: center; padding: 40px; color: #7f8c8d;">
                 ⏳ 正在加载数据...
             </div>
         </div>
+        <div class="grid-more" id="gridMore"></div>
         
         <div class="refresh-info">
-            数据每60秒自动更新一次 | 最后刷新: <span id="lastRefreshTime">--:--:--</span>
+            数据有变化时自动推送 | 最后刷新: <span id="lastRefreshTime">--:--:--</span>
         </div>
     </div>
 
     <script>
-        let refreshInterval = 60; // 60秒刷新一次
-        let countdown = refreshInterval;
+        let refreshInterval = 60; // 浏览器不支持SSE时才定时拉取
         
-        function updateCountdown() {
-            countdown--;
-            document.getElementById('refreshCountdown').textContent = `下次刷新: ${countdown}秒`;
-            
-            if (countdown <= 0) {
-                countdown = refreshInterval;
-                fetchData();
+        // 本地保存的完整数据，服务端只发送变化了的候选人
+        let state = null;
+        // 票数没变化时服务端只告诉页面最近一次检查的时间
+        let currentMeta = null;
+        let lastChecked = 0;
+        
+        function applyPayload(payload) {
+            if (payload.full) {
+                state = {
+                    version: payload.version,
+                    candidates: new Map(payload.candidates.map(c => [c.number, c])),
+                    analytics: payload.analytics || {}
+                };
+            } else {
+                if (!state || state.version !== payload.base_version) {
+                    // 中间漏掉了版本，重新拉取完整数据
+                    fetchData(true);
+                    return;
+                }
+                payload.changed.forEach(c => state.candidates.set(c.number, c));
+                payload.removed.forEach(number => {
+                    state.candidates.delete(number);
+                    delete state.analytics[number];
+                });
+                Object.assign(state.analytics, payload.analytics);
+                state.version = payload.version;
             }
+            
+            const candidates = [...state.candidates.values()].sort((a, b) => a.rank - b.rank);
+            handleData({
+                candidates: candidates,
+                analysis: payload.analysis,
+                analytics: state.analytics,
+                meta: payload.meta
+            });
         }
         
-        function fetchData() {
-            fetch('/api/vote-data')
-                .then(response => response.json())
-                .then(data => {
-                    updateDisplay(data);
-                    document.getElementById('lastRefreshTime').textContent = new Date().toLocaleTimeString();
-                    countdown = refreshInterval;
+        function handleData(data) {
+            updateDisplay(data);
+            loadTrend(false);
+            document.getElementById('lastRefreshTime').textContent = new Date().toLocaleTimeString();
+        }
+        
+        function fetchData(full) {
+            const since = state && !full ? `?since=${state.version}` : '';
+            fetch(`/api/vote-data/{{ vote_id }}${since}`)
+                .then(response => {
+                    lastChecked = parseFloat(response.headers.get('X-Last-Checked')) || lastChecked;
+                    return response.json();
+                })
+                .then(payload => {
+                    applyPayload(payload);
                 })
                 .catch(error => {
                     console.error('获取数据失败:', error);
@@ -273,6 +619,224 @@ HTML_TEMPLATE = '''
                 });
         }
         
+        // 服务端每采集到一次新数据推送一次，页面不再定时轮询
+        function connectStream() {
+            const status = document.getElementById('refreshCountdown');
+            if (!window.EventSource) {
+                fetchData();
+                setInterval(fetchData, refreshInterval * 1000);
+                return;
+            }
+            const source = new EventSource('/api/stream/{{ vote_id }}');
+            source.addEventListener('snapshot', event => {
+                applyPayload(JSON.parse(event.data));
+            });
+            source.addEventListener('checked', event => {
+                lastChecked = JSON.parse(event.data).last_checked_ts;
+                updateAge();
+            });
+            source.onopen = () => {
+                status.textContent = '🟢 实时推送已连接';
+            };
+            source.onerror = () => {
+                // EventSource会自动重连
+                status.textContent = '🟡 推送连接断开，正在重连...';
+            };
+        }
+        
+        function trendText(stats) {
+            if (!stats) return '';
+            const parts = [`+${stats.velocity['15m']}票/分钟`];
+            if (stats.gap_to_next !== null) parts.push(`距上一名${stats.gap_to_next}票`);
+            if (stats.overtake_minutes !== null && stats.overtake_minutes > 0) parts.push(`约${Math.round(stats.overtake_minutes)}分钟追上`);
+            if (stats.projected_final !== null) parts.push(`预计最终${stats.projected_final}票`);
+            return parts.join(' · ');
+        }
+        
+        // 候选人卡片按编号缓存，刷新时只改变化了的字段，排名变化时移动已有节点
+        const cards = new Map();
+        // 候选人很多时只渲染滚动位置附近的一段 [windowStart, windowEnd)，最多MAX_CARDS张卡片；
+        // 窗口上下用占位高度撑开，移出窗口的卡片放回spareCards复用
+        const PAGE_SIZE = 60;
+        const MAX_CARDS = 180;
+        const WINDOW_MARGIN = 600;  // 离视口多远就开始加载
+        let windowStart = 0;
+        let windowEnd = window.IntersectionObserver ? PAGE_SIZE : Infinity;
+        const spareCards = [];
+        let lastData = null;
+        
+        function createCard() {
+            const card = document.createElement('div');
+            card.className = 'candidate-card';
+            card.innerHTML = `
+                <div class="candidate-header">
+                    <div class="rank"></div>
+                    <div class="candidate-info">
+                        <h3></h3>
+                        <div class="candidate-number"></div>
+                    </div>
+                </div>
+                
+                <div class="votes">
+                    <div class="vote-count"></div>
+                    <div class="vote-label">票数</div>
+                </div>
+                
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: 0%"></div>
+                </div>
+                
+                <div class="trend-info"></div>
+                
+                <div class="status">
+                    <span class="status-badge"></span>
+                </div>
+            `;
+            return {
+                card: card,
+                rank: card.querySelector('.rank'),
+                name: card.querySelector('h3'),
+                number: card.querySelector('.candidate-number'),
+                votes: card.querySelector('.vote-count'),
+                fill: card.querySelector('.progress-fill'),
+                trend: card.querySelector('.trend-info'),
+                status: card.querySelector('.status-badge'),
+                last: {}
+            };
+        }
+        
+        function patchCard(refs, candidate, maxVotes, stats) {
+            const next = {
+                rank: candidate.rank,
+                name: candidate.name,
+                number: candidate.number,
+                votes: candidate.votes,
+                width: `${maxVotes > 0 ? (candidate.votes / maxVotes * 100).toFixed(2) : 0}%`,
+                trend: trendText(stats),
+                status: candidate.vote_status
+            };
+            const last = refs.last;
+            if (next.rank !== last.rank) {
+                refs.rank.textContent = next.rank;
+                refs.card.classList.toggle('top3', next.rank <= 3);
+            }
+            if (next.name !== last.name) refs.name.textContent = next.name;
+            if (next.number !== last.number) refs.number.textContent = `${next.number}号候选人`;
+            if (next.votes !== last.votes) refs.votes.textContent = next.votes.toLocaleString();
+            if (next.width !== last.width) refs.fill.style.width = next.width;
+            if (next.trend !== last.trend) refs.trend.textContent = next.trend;
+            if (next.status !== last.status) {
+                refs.status.textContent = next.status;
+                refs.status.className = `status-badge ${next.status.includes('已投') ? 'status-voted' : 'status-not-voted'}`;
+            }
+            refs.last = next;
+        }
+        
+        function gridLayout(grid) {
+            // 每行几张卡片、每行多高（含间距），用来算窗口上下的占位高度
+            const style = getComputedStyle(grid);
+            const columns = Math.max(1, style.gridTemplateColumns.split(' ').length);
+            const first = grid.firstElementChild;
+            const rowHeight = (first ? first.offsetHeight : 260) + (parseFloat(style.rowGap) || 0);
+            // 窗口至少要盖住视口加上下预加载的距离，屏幕特别高时超过MAX_CARDS，不然会来回挪
+            const screenRows = Math.ceil((window.innerHeight + 2 * WINDOW_MARGIN) / rowHeight) + 1;
+            const capacity = Math.max(MAX_CARDS, screenRows * columns + PAGE_SIZE);
+            return {columns: columns, rowHeight: rowHeight, capacity: capacity};
+        }
+        
+        function renderGrid(data) {
+            const grid = document.getElementById('candidatesGrid');
+            const placeholder = grid.querySelector('.grid-placeholder');
+            if (placeholder) placeholder.remove();
+            
+            const total = data.candidates.length;
+            const layout = gridLayout(grid);
+            // 窗口从整行开始，候选人变少时往回收
+            windowStart = Math.max(0, Math.min(windowStart, total - PAGE_SIZE));
+            windowStart -= windowStart % layout.columns;
+            const end = Math.min(windowEnd, windowStart + (window.IntersectionObserver ? layout.capacity : Infinity), total);
+            
+            const visible = data.candidates.slice(windowStart, end);
+            const shown = new Set(visible.map(c => c.number));
+            cards.forEach((refs, number) => {
+                if (!shown.has(number)) {
+                    refs.card.remove();
+                    cards.delete(number);
+                    if (spareCards.length < PAGE_SIZE) spareCards.push(refs);
+                }
+            });
+            
+            // 按排名顺序走一遍，位置不对的节点才移动
+            let cursor = grid.firstElementChild;
+            visible.forEach(candidate => {
+                let refs = cards.get(candidate.number);
+                if (!refs) {
+                    refs = spareCards.pop() || createCard();
+                    cards.set(candidate.number, refs);
+                }
+                patchCard(refs, candidate, data.analysis.max_votes, data.analytics && data.analytics[candidate.number]);
+                if (refs.card === cursor) {
+                    cursor = cursor.nextElementSibling;
+                } else {
+                    grid.insertBefore(refs.card, cursor);
+                }
+            });
+            
+            const before = document.getElementById('gridBefore');
+            const more = document.getElementById('gridMore');
+            const hidden = total - end;
+            before.style.height = `${windowStart / layout.columns * layout.rowHeight}px`;
+            more.style.paddingTop = `${Math.ceil(hidden / layout.columns) * layout.rowHeight}px`;
+            more.textContent = hidden > 0 ? `还有${hidden}位候选人，向下滚动加载` : '';
+            scheduleWindowCheck();
+        }
+        
+        // IntersectionObserver只在进出视口时触发：每次渲染后再检查一遍，
+        // 屏幕很高、加载一批后占位仍在视口里时会接着加载
+        let windowCheckPending = false;
+        function scheduleWindowCheck() {
+            if (windowCheckPending || !window.IntersectionObserver) return;
+            windowCheckPending = true;
+            requestAnimationFrame(() => {
+                windowCheckPending = false;
+                checkWindow();
+            });
+        }
+        
+        function checkWindow() {
+            if (!lastData) return;
+            const total = lastData.candidates.length;
+            const capacity = gridLayout(document.getElementById('candidatesGrid')).capacity;
+            const moreNear = document.getElementById('gridMore').getBoundingClientRect().top < window.innerHeight + WINDOW_MARGIN;
+            const beforeNear = document.getElementById('gridBefore').getBoundingClientRect().bottom > -WINDOW_MARGIN;
+            if (moreNear && windowEnd < total) {
+                windowEnd += PAGE_SIZE;
+                windowStart = Math.max(windowStart, windowEnd - capacity);
+            } else if (beforeNear && windowStart > 0) {
+                windowStart = Math.max(0, windowStart - PAGE_SIZE);
+                windowEnd = Math.min(windowEnd, windowStart + capacity);
+            } else {
+                return;
+            }
+            renderGrid(lastData);
+        }
+        
+        if (window.IntersectionObserver) {
+            const observer = new IntersectionObserver(scheduleWindowCheck, {rootMargin: `${WINDOW_MARGIN}px`});
+            observer.observe(document.getElementById('gridBefore'));
+            observer.observe(document.getElementById('gridMore'));
+        }
+        
+        function updateAge() {
+            if (!currentMeta || !currentMeta.last_update_ts) return;
+            const checked = Math.max(currentMeta.last_update_ts, lastChecked);
+            const age = Math.max(0, Math.round(Date.now() / 1000 - checked));
+            const stale = age > currentMeta.update_interval;
+            document.getElementById('dataAge').textContent = currentMeta.warm_start
+                ? '（上次运行保存的数据，正在刷新）'
+                : `（${age}秒前检查过${stale ? '，数据已过期，正在刷新' : ''}）`;
+        }
+        
         function updateDisplay(data) {
             // 更新统计信息
             document.getElementById('totalCandidates').textContent = data.analysis.total_candidates;
@@ -280,98 +844,1452 @@ HTML_TEMPLATE = '''
             document.getElementById('averageVotes').textContent = data.analysis.average_votes.toLocaleString();
             document.getElementById('maxVotes').textContent = data.analysis.max_votes.toLocaleString();
             document.getElementById('updateTime').textContent = data.analysis.timestamp;
+            currentMeta = data.meta;
+            updateAge();
             
             // 更新候选人列表
-            const grid = document.getElementById('candidatesGrid');
-            grid.innerHTML = '';
-            
-            data.candidates.forEach(candidate => {
-                const maxVotes = data.analysis.max_votes;
-                const percentage = maxVotes > 0 ? (candidate.votes / maxVotes) * 100 : 0;
-                
-                const card = document.createElement('div');
-                card.className = `candidate-card ${candidate.rank <= 3 ? 'top3' : ''}`;
-                
-                card.innerHTML = `
-                    <div class="candidate-header">
-                        <div class="rank">${candidate.rank}</div>
-                        <div class="candidate-info">
-                            <h3>${candidate.name}</h3>
-                            <div class="candidate-number">${candidate.number}号候选人</div>
-                        </div>
-                    </div>
-                    
-                    <div class="votes">
-                        <div class="vote-count">${candidate.votes.toLocaleString()}</div>
-                        <div class="vote-label">票数</div>
-                    </div>
-                    
-                    <div class="progress-bar">
-                        <div class="progress-fill" style="width: ${percentage}%"></div>
-                    </div>
-                    
-                    <div class="status">
-                        <span class="status-badge ${candidate.vote_status.includes('已投') ? 'status-voted' : 'status-not-voted'}">
-                            ${candidate.vote_status}
-                        </span>
-                    </div>
-                `;
-                
-                grid.appendChild(card);
-            });
+            lastData = data;
+            renderGrid(data);
         }
         
-        // 初始加载
-        fetchData();
+        // 趋势图：从服务端取降采样后的历史曲线
+        const TREND_COLORS = ['#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6'];
+        let trendRange = 21600;
+        let lastTrendLoad = 0;
         
-        // 设置定时器
-        setInterval(updateCountdown, 1000);
-        setInterval(fetchData, refreshInterval * 1000);
+        function loadTrend(force) {
+            const now = Date.now() / 1000;
+            if (!force && now - lastTrendLoad < 60) {
+                return;
+            }
+            lastTrendLoad = now;
+            const canvas = document.getElementById('trendChart');
+            const points = Math.max(50, Math.min(1000, Math.floor(canvas.clientWidth / 2)));
+            const from = trendRange ? Math.floor(now - trendRange) : '';
+            fetch(`/api/history/{{ vote_id }}?from=${from}&points=${points}`)
+                .then(response => response.json())
+                .then(drawTrend)
+                .catch(error => console.error('获取趋势数据失败:', error));
+        }
         
-        // 页面可见性变化时刷新数据
-        document.addEventListener('visibilitychange', function() {
-            if (!document.hidden) {
-                fetchData();
+        function drawTrend(data) {
+            const canvas = document.getElementById('trendChart');
+            const dpr = window.devicePixelRatio || 1;
+            const width = canvas.clientWidth;
+            const height = canvas.clientHeight;
+            canvas.width = width * dpr;
+            canvas.height = height * dpr;
+            const ctx = canvas.getContext('2d');
+            ctx.scale(dpr, dpr);
+            ctx.clearRect(0, 0, width, height);
+            ctx.font = '12px sans-serif';
+            ctx.fillStyle = '#7f8c8d';
+            
+            const series = (data.series || []).filter(s => s.points.length > 0);
+            const legend = document.getElementById('trendLegend');
+            if (series.length === 0) {
+                ctx.textAlign = 'center';
+                ctx.fillText('暂无历史数据', width / 2, height / 2);
+                legend.replaceChildren();
+                return;
             }
+            
+            let minT = Infinity, maxT = -Infinity, minV = Infinity, maxV = -Infinity;
+            series.forEach(s => s.points.forEach(([t, v]) => {
+                minT = Math.min(minT, t); maxT = Math.max(maxT, t);
+                minV = Math.min(minV, v); maxV = Math.max(maxV, v);
+            }));
+            if (maxT === minT) maxT = minT + 1;
+            if (maxV === minV) maxV = minV + 1;
+            
+            const left = 60, right = 10, top = 10, bottom = 25;
+            const x = t => left + (t - minT) / (maxT - minT) * (width - left - right);
+            const y = v => height - bottom - (v - minV) / (maxV - minV) * (height - top - bottom);
+            
+            // 坐标轴刻度
+            ctx.strokeStyle = '#ecf0f1';
+            ctx.textAlign = 'right';
+            for (let i = 0; i <= 4; i++) {
+                const v = minV + (maxV - minV) * i / 4;
+                ctx.beginPath();
+                ctx.moveTo(left, y(v));
+                ctx.lineTo(width - right, y(v));
+                ctx.stroke();
+                ctx.fillText(Math.round(v).toLocaleString(), left - 5, y(v) + 4);
+            }
+            ctx.textAlign = 'center';
+            for (let i = 0; i <= 4; i++) {
+                const t = minT + (maxT - minT) * i / 4;
+                const label = new Date(t * 1000).toLocaleTimeString([], {hour: '2-digit', minute: '2-digit'});
+                ctx.fillText(label, x(t), height - 5);
+            }
+            
+            // 曲线
+            series.forEach((s, i) => {
+                ctx.strokeStyle = TREND_COLORS[i % TREND_COLORS.length];
+                ctx.lineWidth = 2;
+                ctx.beginPath();
+                s.points.forEach(([t, v], j) => j === 0 ? ctx.moveTo(x(t), y(v)) : ctx.lineTo(x(t), y(v)));
+                ctx.stroke();
+            });
+            
+            // 名字来自采集到的页面，用textContent，不当HTML解析
+            legend.replaceChildren(...series.map((s, i) => {
+                const span = document.createElement('span');
+                span.style.color = TREND_COLORS[i % TREND_COLORS.length];
+                span.textContent = `● ${s.number}号 ${s.name}`;
+                return span;
+            }));
+        }
+        
+        document.querySelectorAll('.trend-ranges button').forEach(button => {
+            button.addEventListener('click', () => {
+                document.querySelectorAll('.trend-ranges button').forEach(b => b.classList.remove('active'));
+                button.classList.add('active');
+                trendRange = parseInt(button.dataset.range);
+                loadTrend(true);
+            });
         });
+        
+        // 连接推送通道，连接时服务端会先发送当前数据
+        connectStream();
     </script>
 </body>
 </html>
 '''
 
-class VoteDataManager:
+class MetricsRegistry:
+    """进程内的计数器和直方图，/metrics按Prometheus文本格式输出
+    
+    gauge不保存数值，输出时调用回调现算，回调返回 {标签元组: 值}。
+    """
+    
+    SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}  # 名称 -> {'type', 'help', 'buckets', 'values': {标签元组: 值}}
+        self.gauges = {}   # 名称 -> (说明, 回调)
+    
+    def counter(self, name, help_text):
+        self.metrics[name] = {'type': 'counter', 'help': help_text, 'values': {}}
+    
+    def histogram(self, name, help_text, buckets=SECONDS_BUCKETS):
+        self.metrics[name] = {'type': 'histogram', 'help': help_text, 'buckets': tuple(buckets), 'values': {}}
+    
+    def gauge(self, name, help_text, callback):
+        self.gauges[name] = (help_text, callback)
+    
+    def inc(self, name, amount=1, **labels):
+        metric = self.metrics[name]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            metric['values'][key] = metric['values'].get(key, 0) + amount
+    
+    def observe(self, name, value, **labels):
+        metric = self.metrics[name]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            entry = metric['values'].get(key)
+            if entry is None:
+                entry = metric['values'][key] = [[0] * len(metric['buckets']), 0.0, 0]
+            for i, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+    
+    @staticmethod
+    def _labels(key, extra=()):
+        items = list(key) + list(extra)
+        if not items:
+            return ''
+        escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in items) + '}'
+    
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, metric in self.metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in metric['values'].items():
+                    if metric['type'] == 'counter':
+                        lines.append(f"{name}{self._labels(key)} {value}")
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(metric['buckets'], counts):
+                        lines.append(f"{name}_bucket{self._labels(key, [('le', f'{bound:g}')])} {bucket_count}")
+                    lines.append(f"{name}_bucket{self._labels(key, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{self._labels(key)} {total:.6f}")
+                    lines.append(f"{name}_count{self._labels(key)} {count}")
+        
+        for name, (help_text, callback) in self.gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in callback().items():
+                if value is not None:
+                    lines.append(f"{name}{self._labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+METRICS.histogram('bnuvote_phase_seconds', "采集各阶段耗时（秒）")
+METRICS.histogram('bnuvote_scrape_duration_seconds', "一次完整采集的耗时（秒）")
+METRICS.counter('bnuvote_scrapes_total', "采集次数，outcome为changed/unchanged/failed")
+METRICS.counter('bnuvote_login_attempts_total', "各登录方法的尝试次数")
+METRICS.counter('bnuvote_upstream_requests_total', "HTTP轮询模式下向投票网站发出的请求数")
+METRICS.counter('bnuvote_http_requests_total', "本服务收到的请求数")
+METRICS.histogram('bnuvote_http_request_duration_seconds', "本服务处理请求的耗时（秒）", MetricsRegistry.LATENCY_BUCKETS)
+
+class PhaseTimer:
+    """记录一次采集中各阶段的耗时，用于对比每次刷新的时间花在哪里
+    
+    阶段可以嵌套（比如extract里的extract_bulk），嵌套阶段缩进显示，不计入总耗时。
+    每个阶段同时记入bnuvote_phase_seconds直方图。
+    """
+    
     def __init__(self):
+        self.phases = []  # [(名称, 耗时, 嵌套层数)]，按开始顺序
+        self.depth = 0
+    
+    @contextmanager
+    def phase(self, name):
+        index = len(self.phases)
+        self.phases.append((name, 0.0, self.depth))
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.depth -= 1
+            self.phases[index] = (name, duration, self.depth)
+            METRICS.observe('bnuvote_phase_seconds', duration, phase=name)
+    
+    def total(self):
+        return sum(duration for _, duration, depth in self.phases if depth == 0)
+    
+    def report(self):
+        """打印各阶段耗时"""
+        if not self.phases:
+            return
+        print("\n⏱️ 阶段耗时:")
+        for name, duration, depth in self.phases:
+            label = "  " * depth + name
+            print(f"   {label:<20} {duration:7.2f}秒")
+        print(f"   {'total':<20} {self.total():7.2f}秒")
+
+class NetworkIdle:
+    """WebDriverWait条件：页面加载完成且idle_time秒内没有发起新的资源请求"""
+    
+    def __init__(self, idle_time):
+        self.idle_time = idle_time
+        self.count = None
+        self.since = None
+    
+    def __call__(self, driver):
+        count = driver.execute_script(
+            "return document.readyState === 'complete' ? performance.getEntriesByType('resource').length : -1"
+        )
+        now = time.monotonic()
+        if count < 0 or count != self.count:
+            self.count, self.since = count, now
+            return False
+        return now - self.since >= self.idle_time
+
+def _encode_varints(values):
+    """zigzag + varint编码整数序列"""
+    out = bytearray()
+    for value in values:
+        value = (value << 1) ^ (value >> 63)
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+def _decode_varints(data):
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+    return values
+
+def encode_series(points):
+    """把[(时间戳, 票数), ...]编码成压缩块：两列分别做差分，再varint + zlib"""
+    ts_deltas, vote_deltas = [], []
+    prev_ts = prev_votes = 0
+    for ts, votes in points:
+        ts_deltas.append(ts - prev_ts)
+        vote_deltas.append(votes - prev_votes)
+        prev_ts, prev_votes = ts, votes
+    return zlib.compress(_encode_varints(ts_deltas) + _encode_varints(vote_deltas))
+
+def decode_series(blob, count):
+    values = _decode_varints(zlib.decompress(blob))
+    points = []
+    ts = votes = 0
+    for ts_delta, vote_delta in zip(values[:count], values[count:]):
+        ts += ts_delta
+        votes += vote_delta
+        points.append((ts, votes))
+    return points
+
+class VoteHistoryStore:
+    """只追加的票数历史库，按 (投票id, 候选人编号, 时间) 存储
+    
+    每个候选人只在票数变化时记一个点（票数在两个点之间保持不变），新点先写进
+    recent表，攒够CHUNK_SIZE个后差分编码压缩成一个块存进chunks表。
+    """
+    
+    CHUNK_SIZE = 256
+    
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                poll_id TEXT, number INTEGER, name TEXT,
+                PRIMARY KEY (poll_id, number));
+            CREATE TABLE IF NOT EXISTS recent (
+                poll_id TEXT, number INTEGER, ts INTEGER, votes INTEGER);
+            CREATE INDEX IF NOT EXISTS recent_series ON recent (poll_id, number, ts);
+            CREATE TABLE IF NOT EXISTS chunks (
+                poll_id TEXT, number INTEGER, start_ts INTEGER, end_ts INTEGER,
+                count INTEGER, data BLOB,
+                PRIMARY KEY (poll_id, number, start_ts));
+        """)
+        self.conn.commit()
+        
+        # 每个序列最后一个点和recent表里的点数，用来跳过没变的票数、判断何时压缩
+        self.last = {}
+        self.pending = {}
+        for poll_id, number, ts, votes in self.conn.execute("""
+                SELECT poll_id, number, ts, votes FROM recent r
+                WHERE ts = (SELECT MAX(ts) FROM recent WHERE poll_id = r.poll_id AND number = r.number)"""):
+            self.last[(poll_id, number)] = (ts, votes)
+        for poll_id, number, count in self.conn.execute(
+                "SELECT poll_id, number, COUNT(*) FROM recent GROUP BY poll_id, number"):
+            self.pending[(poll_id, number)] = count
+        for poll_id, number, count, data in self.conn.execute("""
+                SELECT poll_id, number, count, data FROM chunks c
+                WHERE start_ts = (SELECT MAX(start_ts) FROM chunks WHERE poll_id = c.poll_id AND number = c.number)"""):
+            if (poll_id, number) not in self.last:
+                self.last[(poll_id, number)] = decode_series(data, count)[-1]
+    
+    def append(self, poll_id, candidates, ts=None):
+        """记录一次采集结果，返回实际写入的点数"""
+        poll_id = str(poll_id)
+        ts = int(ts if ts is not None else time.time())
+        rows, names = [], []
+        for candidate in candidates:
+            key = (poll_id, candidate['number'])
+            last = self.last.get(key)
+            if last is None:
+                names.append((poll_id, candidate['number'], candidate['name']))
+            if last is not None and (last[1] == candidate['votes'] or ts <= last[0]):
+                continue
+            rows.append((poll_id, candidate['number'], ts, candidate['votes']))
+        
+        with self.lock:
+            if names:
+                self.conn.executemany("INSERT OR REPLACE INTO candidates VALUES (?, ?, ?)", names)
+            if rows:
+                self.conn.executemany("INSERT INTO recent VALUES (?, ?, ?, ?)", rows)
+            for poll_id_, number, ts_, votes in rows:
+                key = (poll_id_, number)
+                self.last[key] = (ts_, votes)
+                self.pending[key] = self.pending.get(key, 0) + 1
+                if self.pending[key] >= self.CHUNK_SIZE:
+                    self._compact(key)
+            self.conn.commit()
+        return len(rows)
+    
+    def backfill(self, poll_id, snapshots):
+        """把离线得到的历史快照[(时间戳, 候选人列表), ...]合并进库，返回新增的点数
+        
+        时间可以早于库里已有的点：涉及的序列整个读出来合并（同一时刻以库里的为准），
+        去掉票数没变的点后重新切块写回。只用于离线补历史，不要和采集同时进行。
+        """
+        poll_id = str(poll_id)
+        incoming, names = {}, {}
+        for ts, candidates in snapshots:
+            for candidate in candidates:
+                incoming.setdefault(candidate['number'], {})[int(ts)] = candidate['votes']
+                names[candidate['number']] = candidate['name']
+        if not incoming:
+            return 0
+        existing = self.query(poll_id, list(incoming))
+        
+        written = 0
+        with self.lock:
+            self.conn.executemany("INSERT OR IGNORE INTO candidates VALUES (?, ?, ?)",
+                                  [(poll_id, number, name) for number, name in names.items()])
+            for number, points in incoming.items():
+                key = (poll_id, number)
+                old = existing.get(number, [])
+                points.update(old)
+                merged = []
+                for ts, votes in sorted(points.items()):
+                    if not merged or merged[-1][1] != votes:
+                        merged.append((ts, votes))
+                written += len(set(merged) - set(old))
+                
+                self.conn.execute("DELETE FROM chunks WHERE poll_id = ? AND number = ?", key)
+                self.conn.execute("DELETE FROM recent WHERE poll_id = ? AND number = ?", key)
+                full = len(merged) - len(merged) % self.CHUNK_SIZE
+                for i in range(0, full, self.CHUNK_SIZE):
+                    chunk = merged[i:i + self.CHUNK_SIZE]
+                    self.conn.execute("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                                      key + (chunk[0][0], chunk[-1][0], len(chunk), encode_series(chunk)))
+                self.conn.executemany("INSERT INTO recent VALUES (?, ?, ?, ?)",
+                                      [key + point for point in merged[full:]])
+                self.last[key] = merged[-1]
+                self.pending[key] = len(merged) - full
+            self.conn.commit()
+        return written
+    
+    def _compact(self, key):
+        """把一个序列recent表里的点压缩成一个块"""
+        points = self.conn.execute(
+            "SELECT ts, votes FROM recent WHERE poll_id = ? AND number = ? ORDER BY ts", key).fetchall()
+        if not points:
+            return
+        self.conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                          key + (points[0][0], points[-1][0], len(points), encode_series(points)))
+        self.conn.execute("DELETE FROM recent WHERE poll_id = ? AND number = ?", key)
+        self.pending[key] = 0
+    
+    def candidate_names(self, poll_id):
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT number, name FROM candidates WHERE poll_id = ?", (str(poll_id),)))
+    
+    def query(self, poll_id, numbers=None, start=None, end=None):
+        """查询时间范围内的票数序列，返回 {编号: [(时间戳, 票数), ...]}
+        
+        每个序列开头会带上start之前最后一个点（那一刻的票数），方便画图。
+        """
+        poll_id = str(poll_id)
+        start = int(start) if start is not None else 0
+        end = int(end) if end is not None else 2 ** 62
+        number_filter, params = "", []
+        if numbers is not None:
+            numbers = list(numbers)
+            number_filter = f" AND number IN ({','.join('?' * len(numbers))})"
+            params = numbers
+        
+        series = {}
+        with self.lock:
+            chunk_rows = self.conn.execute(
+                "SELECT number, count, data FROM chunks WHERE poll_id = ? AND end_ts >= ? AND start_ts <= ?"
+                + number_filter + " ORDER BY number, start_ts", [poll_id, start, end] + params).fetchall()
+            recent_rows = self.conn.execute(
+                "SELECT number, ts, votes FROM recent WHERE poll_id = ? AND ts <= ?"
+                + number_filter + " ORDER BY number, ts", [poll_id, end] + params).fetchall()
+            # 范围开始前的最后一个点可能在更早的块里
+            before_rows = self.conn.execute(
+                "SELECT number, count, data FROM chunks c WHERE poll_id = ? AND start_ts < ?" + number_filter
+                + " AND start_ts = (SELECT MAX(start_ts) FROM chunks WHERE poll_id = c.poll_id"
+                  " AND number = c.number AND start_ts < ?)", [poll_id, start] + params + [start]).fetchall()
+        
+        for number, count, data in before_rows + chunk_rows:
+            series.setdefault(number, []).extend(decode_series(data, count))
+        for number, ts, votes in recent_rows:
+            series.setdefault(number, []).append((ts, votes))
+        
+        result = {}
+        for number, points in series.items():
+            points = sorted(set(points))
+            head = [p for p in points if p[0] < start][-1:]
+            result[number] = head + [p for p in points if start <= p[0] <= end]
+        return result
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class PageArchive:
+    """采集到的原始页面存档
+    
+    页面按内容哈希gzip压缩存成 objects/<哈希>.gz，同样的内容只存一份；每次采集在
+    index.jsonl里追加一行（时间、投票id、地址、类型、哈希）。页面和索引的总大小超过
+    budget时，按最后一次出现的时间从旧到新删除页面，并把索引里对应的行一起去掉。
+    """
+    
+    def __init__(self, directory=PAGE_ARCHIVE_DIR, budget=PAGE_ARCHIVE_BUDGET):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.budget = budget
+        self.lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        
+        # 哈希 -> [压缩后大小, 最后一次出现的时间, 索引里对应行的总字节数]
+        self.objects = {}
+        for name in os.listdir(self.objects_dir):
+            if name.endswith(".gz"):
+                path = os.path.join(self.objects_dir, name)
+                self.objects[name[:-3]] = [os.path.getsize(path), os.path.getmtime(path), 0]
+        for entry in self.entries():
+            if entry['hash'] in self.objects:
+                info = self.objects[entry['hash']]
+                info[1] = max(info[1], entry['ts'])
+                info[2] += len(self._index_line(entry))
+        self.size = sum(size for size, _, _ in self.objects.values()) + self._index_size()
+    
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, f"{digest}.gz")
+    
+    @staticmethod
+    def _index_line(entry):
+        return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    
+    def _index_size(self):
+        try:
+            return os.path.getsize(self.index_path)
+        except FileNotFoundError:
+            return 0
+    
+    def record(self, poll_id, url, body, kind="html", ts=None):
+        """存档一次采集到的页面，返回内容哈希"""
+        ts = ts if ts is not None else time.time()
+        data = body.encode("utf-8")
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with self.lock:
+            if digest not in self.objects:
+                path = self._object_path(digest)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(gzip.compress(data, compresslevel=6))
+                os.replace(tmp_path, path)
+                size = os.path.getsize(path)
+                self.objects[digest] = [size, ts, 0]
+                self.size += size
+            else:
+                self.objects[digest][1] = ts
+            line = self._index_line({'ts': ts, 'poll': str(poll_id), 'url': url, 'kind': kind, 'hash': digest})
+            with open(self.index_path, "ab") as f:
+                f.write(line)
+            self.objects[digest][2] += len(line)
+            self.size += len(line)
+            if self.size > self.budget:
+                self._evict()
+        return digest
+    
+    def _evict(self):
+        """删掉最久没出现过的页面直到总大小（含索引）降到预算的90%，并重写索引"""
+        evicted = set()
+        for digest, (size, _, index_bytes) in sorted(self.objects.items(), key=lambda item: item[1][1]):
+            if self.size <= self.budget * 0.9:
+                break
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+            self.size -= size + index_bytes
+            evicted.add(digest)
+        for digest in evicted:
+            del self.objects[digest]
+        
+        # 页面文件已经不在的旧行也一起去掉
+        kept = [entry for entry in self.entries() if entry['hash'] in self.objects]
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for entry in kept:
+                f.write(self._index_line(entry))
+        os.replace(tmp_path, self.index_path)
+        self.size = sum(size for size, _, _ in self.objects.values()) + self._index_size()
+        print(f"🧹 页面存档超过上限，删除了 {len(evicted)} 个旧页面")
+    
+    def entries(self, poll_ids=None):
+        """按时间顺序遍历索引，poll_ids不为空时只返回这些投票的记录"""
+        poll_ids = {str(p) for p in poll_ids} if poll_ids else None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 写到一半的行
+            if poll_ids is None or entry['poll'] in poll_ids:
+                entries.append(entry)
+        entries.sort(key=lambda entry: entry['ts'])
+        return entries
+    
+    def load(self, digest):
+        """读取一个存档页面，已被删除时返回None"""
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return gzip.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+def archive_page(poll_id, url, body, kind="html"):
+    """开启了页面存档时存档一次采集到的页面；存档失败不影响采集"""
+    if page_archive is None or not body:
+        return
+    try:
+        page_archive.record(poll_id, url, body, kind)
+    except OSError as e:
+        print(f"⚠️ 页面存档失败: {e}")
+
+def parse_archived_page(entry, body):
+    """用和采集时相同的解析流程处理一个存档页面"""
+    if entry['kind'] == 'json':
+        try:
+            candidates_data = parse_vote_json(json.loads(body), entry['url'])
+        except ValueError:
+            return None
+        if not candidates_data:
+            return None
+        return {'candidates': candidates_data, 'analysis': analyze_vote_results(candidates_data)}
+    return BNUVoteHTMLExtractor(body, entry['url']).parse()
+
+class VoteAnalytics:
+    """候选人×时间票数矩阵上的向量化分析
+    
+    每个候选人计算各滑动窗口的每分钟增票、与前一名的差距、按当前相对速度追上
+    前一名的预计分钟数，以及（设置了截止时间时）最终票数预测。矩阵只保留最长
+    窗口内的列，新快照到来时追加一列，不重新计算全部历史。
+    """
+    
+    WINDOWS = {'5m': 300, '15m': 900, '60m': 3600}
+    OVERTAKE_WINDOW = '15m'    # 估算追赶时间用的速度
+    PROJECTION_WINDOW = '60m'  # 预测最终票数用的速度
+    
+    def __init__(self, deadline=None):
+        self.deadline = deadline  # 截止时间（Unix时间戳）
+        self.horizon = max(self.WINDOWS.values())
+        self.rows = {}            # 候选人编号 -> 行号
+        self.numbers = []         # 行号 -> 候选人编号
+        self.buf = np.zeros((16, 64), dtype=np.int64)
+        self.times = np.zeros(64, dtype=np.float64)
+        self.start = self.end = 0  # 有效列范围 [start, end)
+        self.active = np.zeros(0, dtype=np.int64)  # 最近一次快照里出现的行
+    
+    def _ensure_rows(self, count):
+        if count > self.buf.shape[0]:
+            grown = np.zeros((max(count, self.buf.shape[0] * 2), self.buf.shape[1]), dtype=np.int64)
+            grown[:self.buf.shape[0]] = self.buf
+            self.buf = grown
+    
+    def _ensure_column(self):
+        if self.end < self.buf.shape[1]:
+            return
+        width = self.end - self.start
+        if width * 2 > self.buf.shape[1]:
+            # 有效列已超过一半：扩容
+            buf = np.zeros((self.buf.shape[0], self.buf.shape[1] * 2), dtype=np.int64)
+            times = np.zeros(self.buf.shape[1] * 2, dtype=np.float64)
+        else:
+            # 把有效列挪回开头
+            buf, times = self.buf, self.times
+        buf[:, :width] = self.buf[:, self.start:self.end]
+        times[:width] = self.times[self.start:self.end]
+        self.buf, self.times = buf, times
+        self.start, self.end = 0, width
+    
+    def update(self, ts, candidates):
+        """追加一次快照"""
+        if self.end > self.start and ts <= self.times[self.end - 1]:
+            return
+        numbers = np.fromiter((c['number'] for c in candidates), dtype=np.int64, count=len(candidates))
+        votes = np.fromiter((c['votes'] for c in candidates), dtype=np.int64, count=len(candidates))
+        
+        new_numbers = [n for n in numbers.tolist() if n not in self.rows]
+        if new_numbers:
+            self._ensure_rows(len(self.numbers) + len(new_numbers))
+            for number in new_numbers:
+                self.rows[number] = len(self.numbers)
+                self.numbers.append(number)
+        rows = np.fromiter((self.rows[n] for n in numbers.tolist()), dtype=np.int64, count=len(numbers))
+        
+        self._ensure_column()
+        column = self.buf[:, self.end - 1].copy() if self.end > self.start else np.zeros(self.buf.shape[0], dtype=np.int64)
+        column[rows] = votes
+        if new_numbers and self.end > self.start:
+            # 新出现的候选人没有历史，当作之前一直是当前票数
+            new_rows = np.array([self.rows[n] for n in new_numbers])
+            self.buf[new_rows, self.start:self.end] = column[new_rows, None]
+        self.buf[:, self.end] = column
+        self.times[self.end] = ts
+        self.end += 1
+        self.active = rows
+        
+        # 丢掉最长窗口之外的列，保留一列作为窗口起点的基准
+        cutoff = np.searchsorted(self.times[self.start:self.end], ts - self.horizon, side='right') - 1
+        if cutoff > 0:
+            self.start += int(cutoff)
+    
+    def load_history(self, history, poll_id, now=None):
+        """重启后从历史库恢复最近一个最长窗口的数据（在刚创建、还没有快照时调用）
+        
+        直接拼出整个矩阵：每个序列对所有时间点做一次searchsorted向前填充，
+        不再逐个时间点调用update。
+        """
+        now = now if now is not None else time.time()
+        series = history.query(poll_id, None, now - self.horizon, now)
+        if not series:
+            return
+        times = np.unique(np.fromiter((ts for points in series.values() for ts, _ in points), dtype=np.float64))
+        
+        self.numbers = list(series)
+        self.rows = {number: row for row, number in enumerate(self.numbers)}
+        self.buf = np.zeros((max(len(self.numbers), 16), max(len(times) * 2, 64)), dtype=np.int64)
+        self.times = np.zeros(self.buf.shape[1], dtype=np.float64)
+        for row, number in enumerate(self.numbers):
+            points = np.asarray(series[number], dtype=np.int64)
+            # 票数在记录点之间保持不变：取每个时间点之前最后一个点；
+            # 第一个点之前和update里新出现的候选人一样，当作一直是这个票数
+            idx = np.searchsorted(points[:, 0], times, side='right') - 1
+            self.buf[row, :len(times)] = points[np.maximum(idx, 0), 1]
+        self.times[:len(times)] = times
+        self.end = len(times)
+        self.active = np.arange(len(self.numbers), dtype=np.int64)
+        
+        cutoff = np.searchsorted(times, times[-1] - self.horizon, side='right') - 1
+        self.start = max(int(cutoff), 0)
+    
+    def compute(self):
+        """计算最近一次快照中各候选人的分析结果，返回 {编号: {...}}"""
+        if self.end == self.start or len(self.active) == 0:
+            return {}
+        
+        times = self.times[self.start:self.end]
+        matrix = self.buf[self.active, self.start:self.end]
+        now = times[-1]
+        current = matrix[:, -1]
+        
+        velocity = {}
+        for name, window in self.WINDOWS.items():
+            j = max(int(np.searchsorted(times, now - window, side='right')) - 1, 0)
+            minutes = (now - times[j]) / 60
+            velocity[name] = (current - matrix[:, j]) / minutes if minutes > 0 else np.zeros(len(current))
+        
+        # 按当前票数排序，计算与前一名的差距和相对速度
+        order = np.argsort(-current, kind='stable')
+        above = np.full(len(current), -1)
+        above[order[1:]] = order[:-1]
+        has_above = above >= 0
+        gap = np.where(has_above, current[above] - current, 0)
+        speed = velocity[self.OVERTAKE_WINDOW]
+        closing = np.where(has_above, speed - speed[above], 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            overtake = np.where(has_above & (closing > 0), gap / closing, np.nan)
+        overtake = np.where(has_above & (gap == 0), 0.0, overtake)
+        
+        projected = None
+        if self.deadline is not None:
+            remaining = max(self.deadline - now, 0) / 60
+            projected = current + velocity[self.PROJECTION_WINDOW] * remaining
+        
+        result = {}
+        for i, row in enumerate(self.active.tolist()):
+            result[self.numbers[row]] = {
+                'velocity': {name: round(float(v[i]), 2) for name, v in velocity.items()},
+                'gap_to_next': int(gap[i]) if has_above[i] else None,
+                'overtake_minutes': None if np.isnan(overtake[i]) else round(float(overtake[i]), 1),
+                'projected_final': int(round(projected[i])) if projected is not None else None,
+            }
+        return result
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets降采样，保留曲线形状的同时把点数降到threshold"""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_bucket = points[next_start:next_end]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+        
+        # 当前桶里与上一个选中点、下一个桶平均点组成三角形面积最大的点
+        ax, ay = points[a]
+        best, best_area = None, -1
+        for j in range(int(i * bucket_size) + 1, next_start):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    
+    sampled.append(points[-1])
+    return sampled
+
+class EncodedBody:
+    """预先编码好的响应体：原文、gzip和brotli各一份，以及对应的强ETag
+    
+    数据变化时生成一次，之后每个请求只是挑选编码、比较ETag。
+    """
+    
+    MIN_COMPRESS_SIZE = 256
+    
+    def __init__(self, body, content_type, cache_control='no-cache'):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.bodies = {'identity': body}
+        if len(body) >= self.MIN_COMPRESS_SIZE:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(body, quality=5)
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        # 不同编码是不同的表示，强ETag要区分开
+        self.etags = {enc: f'"{digest}"' if enc == 'identity' else f'"{digest}-{enc}"' for enc in self.bodies}
+    
+    @classmethod
+    def from_json(cls, data):
+        return cls(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+                   'application/json; charset=utf-8')
+    
+    @property
+    def text(self):
+        return self.bodies['identity'].decode('utf-8')
+    
+    def choose_encoding(self, accept_encoding):
+        accepted = set()
+        for token in accept_encoding.split(','):
+            name, _, params = token.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(name.strip().lower())
+        for enc in ('br', 'gzip'):
+            if enc in self.bodies and enc in accepted:
+                return enc
+        return 'identity'
+    
+    def response(self, req, headers=None):
+        """按请求的Accept-Encoding和If-None-Match生成响应（可能是304）"""
+        enc = self.choose_encoding(req.headers.get('Accept-Encoding', ''))
+        headers = dict(headers or {})
+        headers.update({
+            'ETag': self.etags[enc],
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        })
+        if_none_match = req.headers.get('If-None-Match', '')
+        client_etags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if self.etags[enc] in client_etags or '*' in client_etags:
+            return Response(status=304, headers=headers)
+        if enc != 'identity':
+            headers['Content-Encoding'] = enc
+        return Response(self.bodies[enc], content_type=self.content_type, headers=headers)
+
+class SnapshotBroadcaster:
+    """通过SSE把新数据推送给所有连接的页面
+    
+    每次发布只序列化一次，所有连接共用同一段消息；某个连接积压太多时丢掉最旧的消息。
+    """
+    
+    def __init__(self, backlog=8):
+        self.backlog = backlog
+        self.clients = set()
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def format_event(event, data):
+        """data可以是已经序列化好的JSON文本"""
+        if not isinstance(data, str):
+            data = json.dumps(data, ensure_ascii=False)
+        return f"event: {event}\ndata: {data}\n\n"
+    
+    def subscribe(self):
+        client = queue.Queue(maxsize=self.backlog)
+        with self.lock:
+            self.clients.add(client)
+        return client
+    
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+    
+    def publish(self, event, data):
+        message = self.format_event(event, data)
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                try:
+                    client.get_nowait()
+                except queue.Empty:
+                    pass
+                client.put_nowait(message)
+        return len(clients)
+
+class BrowserPool:
+    """数量有限的常驻浏览器，供所有投票共用
+    
+    每个浏览器同一时间只服务一次采集；浏览器之间通过SESSION_FILE共享登录会话。
+    """
+    
+    def __init__(self, size=MAX_BROWSERS):
+        self.size = size
+        self.idle = queue.Queue()
+        self.created = 0
+        self.solvers = []  # 创建过的所有浏览器，包括正在采集的
+        self.lock = threading.Lock()
+    
+    @contextmanager
+    def acquire(self):
+        """借出一个浏览器，用完自动归还；都在忙且已达上限时等待"""
+        try:
+            solver = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            if create:
+                try:
+                    solver = BNUVoteSolver(persistent=True)
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+                with self.lock:
+                    self.solvers.append(solver)
+            else:
+                solver = self.idle.get()
+        
+        try:
+            yield solver
+        finally:
+            self.idle.put(solver)
+    
+    def close_all(self):
+        """关闭所有浏览器（退出时调用，正在采集的也一起关掉）"""
+        with self.lock:
+            solvers, self.solvers = self.solvers, []
+            self.created = 0
+        while True:
+            try:
+                self.idle.get_nowait()
+            except queue.Empty:
+                break
+        for solver in solvers:
+            solver.close()
+
+class VoteDataManager:
+    def __init__(self, vote_id=VOTE_IDS[0], pool=None, persistent=PERSISTENT_SESSION, history=None):
+        self.vote_id = str(vote_id)
+        self.vote_url = vote_url_for(vote_id)
+        self.pool = pool  # 持久模式下共享的浏览器池
+        self.history = history  # 票数历史库
+        self.analytics = None   # 增速/差距/预测分析，第一次更新时创建
+        self.broadcaster = SnapshotBroadcaster()  # SSE推送
+        self.version = 0  # 数据版本号（毫秒时间戳，重启后也不会和旧版本重复）
+        self.versions = deque(maxlen=SNAPSHOT_VERSIONS)  # [(版本号, {编号: 候选人关键字段}, analytics)]
+        self.payload_cache = {}  # (版本号, 基准版本号或None) -> EncodedBody
         self.current_data = None
-        self.last_update = None
-        self.update_interval = 300  # 5分钟更新一次数据
+        self.last_update = None   # 票数最近一次变化的时间
+        self.last_checked = None  # 最近一次成功采集的时间（票数不一定有变化）
+        intervals = POLL_INTERVALS[POLL_MODE]
+        self.pacer = AdaptiveInterval(intervals['initial'], intervals['min_interval'], intervals['max_interval'])
+        self.update_interval = self.pacer.interval  # 由pacer根据票数变化调整
+        self.persistent = persistent
+        self.poller = None  # HTTP轮询模式下的HTTP客户端
+        self.http_retry_at = 0.0  # HTTP拿不到数据时，在这之前改用常驻浏览器采集
+        self.lock = threading.Lock()
+        self.inflight = None  # 正在进行的刷新（Future），保证同一时间只有一次采集
+        self.warm = False  # 当前数据来自上次运行保存的快照，还没有采集过
+        self.snapshot_mtime = None
+        self.snapshot_file = SNAPSHOT_FILE.format(vote_id=self.vote_id) if SNAPSHOT_FILE else None
+        self.load_snapshot()
+    
+    def load_snapshot(self):
+        """读取上次运行保存的数据，让页面重启后马上有内容可显示"""
+        if not self.snapshot_file:
+            return False
+        snapshot = load_json_file(self.snapshot_file)
+        if not snapshot or not snapshot.get('data'):
+            return False
+        self.record_version(snapshot['data'], snapshot.get('version'),
+                            datetime.fromtimestamp(snapshot['last_update']), warm=True)
+        print(f"💾 已加载上次保存的数据 (id={self.vote_id}，{self.last_update:%Y-%m-%d %H:%M:%S})，等待第一次采集")
+        return True
+    
+    def save_snapshot(self):
+        """原子写入当前数据，进程被杀掉时也不会留下写了一半的文件"""
+        if not self.snapshot_file:
+            return
+        try:
+            save_json_file(self.snapshot_file, {
+                'vote_id': self.vote_id,
+                'version': self.version,
+                'last_update': self.last_update.timestamp(),
+                'update_interval': self.update_interval,
+                'data': self.current_data,
+            })
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ 保存数据快照失败: {e}")
+    
+    def touch_snapshot(self):
+        """票数没变化时只更新快照文件的修改时间，web-only进程据此知道最近检查过"""
+        if not self.snapshot_file:
+            return
+        try:
+            os.utime(self.snapshot_file)
+        except OSError:
+            pass
+    
+    def follow_snapshots(self):
+        """切换到web-only模式：数据只来自采集进程写的快照文件"""
+        with self.lock:
+            self.warm = False
+            self.payload_cache = {}
+        self.snapshot_mtime = None
+        self.sync_snapshot()
+    
+    def sync_snapshot(self):
+        """快照文件有变化时重新加载；版本号沿用采集进程的，多个web进程之间增量也能对上"""
+        try:
+            mtime = os.stat(self.snapshot_file).st_mtime
+        except (OSError, TypeError):
+            return
+        if mtime == self.snapshot_mtime:
+            return
+        self.snapshot_mtime = mtime
+        self.last_checked = datetime.fromtimestamp(mtime)
+        
+        snapshot = load_json_file(self.snapshot_file)
+        if not snapshot or not snapshot.get('data'):
+            return
+        if snapshot.get('version') == self.version:
+            self.broadcaster.publish('checked', {'last_checked_ts': mtime})
+            return
+        self.update_interval = snapshot.get('update_interval', self.update_interval)
+        previous_version = self.record_version(snapshot['data'], snapshot.get('version'),
+                                               datetime.fromtimestamp(snapshot['last_update']))
+        self.publish(previous_version)
+    
+    def data_age(self):
+        """当前数据距上次成功采集的秒数，没有数据时返回None"""
+        checked = self.last_checked or self.last_update
+        if checked is None:
+            return None
+        return (datetime.now() - checked).total_seconds()
+    
+    def is_stale(self):
+        age = self.data_age()
+        return self.current_data is None or self.warm or age is None or age > self.update_interval
     
     def get_data(self):
-        """获取当前数据，如果数据太旧则更新"""
-        if (self.current_data is None or 
-            self.last_update is None or 
-            (datetime.now() - self.last_update).seconds > self.update_interval):
-            self.update_data()
+        """立即返回当前数据
+        
+        请求和SSE连接从不触发采集：什么时候采集只由PollScheduler决定，
+        这样抖动、退避和每小时预算不会被页面访问绕过。
+        """
         return self.current_data
     
+    def get_meta(self):
+        """描述当前数据新旧程度，随API响应一起返回"""
+        age = self.data_age()
+        return {
+            'last_update': self.last_update.strftime("%Y-%m-%d %H:%M:%S") if self.last_update else None,
+            'last_checked': self.last_checked.timestamp() if self.last_checked else None,
+            'age_seconds': round(age, 1) if age is not None else None,
+            'stale': self.is_stale(),
+            'refreshing': self.inflight is not None,
+        }
+    
+    def refresh(self, wait=True):
+        """刷新数据，多个调用方同时触发时合并为一次采集
+        
+        wait为False时在后台线程中采集并立即返回。返回对应这次采集的Future。
+        """
+        with self.lock:
+            future = self.inflight
+            leader = future is None
+            if leader:
+                future = self.inflight = Future()
+        
+        if leader:
+            if wait:
+                self._run_refresh(future)
+            else:
+                threading.Thread(target=self._run_refresh, args=(future,), daemon=True).start()
+        elif wait:
+            future.result()
+        return future
+    
+    def _run_refresh(self, future):
+        try:
+            self.update_data()
+        finally:
+            with self.lock:
+                self.inflight = None
+            future.set_result(self.current_data)
+    
+    def scrape_with_browser(self):
+        """用浏览器采集一次数据"""
+        if self.persistent:
+            if self.pool is None:
+                self.pool = BrowserPool(1)
+            with self.pool.acquire() as solver:
+                return solver.refresh(USERNAME, PASSWORD, vote_id=self.vote_id)
+        
+        solver = BNUVoteSolver(vote_id=self.vote_id)
+        return solver.run(USERNAME, PASSWORD)
+    
+    def use_intervals(self, mode):
+        """切换采集间隔的上下限（HTTP退回浏览器采集时不能再按HTTP的频率开浏览器）"""
+        intervals = POLL_INTERVALS[mode]
+        self.pacer.min_interval = intervals['min_interval']
+        self.pacer.max_interval = intervals['max_interval']
+        self.pacer.interval = max(self.pacer.min_interval, min(self.pacer.max_interval, self.pacer.interval))
+        self.update_interval = self.pacer.interval
+    
+    def update_via_http(self):
+        """HTTP轮询模式：浏览器只用来登录和发现数据接口，平时直接发HTTP请求
+        
+        HTTP请求拿不到投票数据时，接下来HTTP_FALLBACK_DURATION秒内改用常驻浏览器、
+        按浏览器模式的间隔采集，每次顺便记录页面请求过的接口，到时间再试HTTP。
+        """
+        if self.poller is None:
+            self.poller = VoteHTTPPoller(page_url=self.vote_url)
+            # 冷启动时先试试保存的会话，有效的话完全不用启动浏览器
+            self.poller.load_session(load_json_file(SESSION_FILE))
+        
+        if time.time() < self.http_retry_at:
+            return self.scrape_with_pool_for_discovery()
+        
+        try:
+            result = self.poller.fetch()
+        except SessionExpired:
+            print("🔐 HTTP会话已失效，用浏览器重新登录...")
+        except requests.RequestException as e:
+            print(f"❌ HTTP请求失败: {e}")
+            return None
+        else:
+            if result:
+                if self.http_retry_at:
+                    self.http_retry_at = 0.0
+                    self.use_intervals("http")
+                return result
+            # 退回浏览器放在try外面，浏览器的错误不会被当成HTTP请求失败
+            print(f"⚠️ HTTP请求没有拿到投票数据，接下来{HTTP_FALLBACK_DURATION // 60}分钟改用常驻浏览器采集...")
+            self.http_retry_at = time.time() + HTTP_FALLBACK_DURATION
+            self.use_intervals("browser")
+            return self.scrape_with_pool_for_discovery()
+        
+        # 用浏览器完整采集一次，顺便记录数据接口并把新会话交给HTTP客户端
+        solver = BNUVoteSolver(persistent=True, vote_id=self.vote_id)
+        try:
+            result = solver.refresh(USERNAME, PASSWORD)
+            if result:
+                solver.save_session()
+                self.poller.load_session(load_json_file(SESSION_FILE))
+            return result
+        finally:
+            # 稳定轮询阶段不再需要Chrome
+            solver.close()
+    
+    def scrape_with_pool_for_discovery(self):
+        """HTTP退回浏览器期间：用浏览器池里的常驻浏览器采集，并把新发现的接口交给HTTP客户端"""
+        if self.pool is None:
+            self.pool = BrowserPool(1)
+        with self.pool.acquire() as solver:
+            result = solver.refresh(USERNAME, PASSWORD, vote_id=self.vote_id)
+            if result:
+                solver.save_session()
+        if result:
+            self.poller.load_session(load_json_file(SESSION_FILE))
+        return result
+    
+    @staticmethod
+    def candidate_key(candidate):
+        """判断候选人是否变化时比较的字段"""
+        return (candidate['votes'], candidate['rank'], candidate['vote_status'],
+                candidate['name'], candidate['image_url'])
+    
+    def record_version(self, result, version=None, last_update=None, warm=False, analytics=None):
+        """换上新数据并分配版本号（或沿用快照里的version）记入版本环，返回上一个版本号
+        
+        数据、分析结果、更新时间和版本号在同一把锁里一起换，请求不会拿到新数据配旧版本号。
+        """
+        with self.lock:
+            if analytics is not None:
+                result['analytics'] = analytics
+            self.current_data = result
+            if last_update is not None:
+                self.last_update = last_update
+            self.warm = warm
+            previous = self.version
+            self.version = version if version is not None else max(previous + 1, int(time.time() * 1000))
+            index = {c['number']: self.candidate_key(c) for c in result['candidates']}
+            self.versions.append((self.version, index, result.get('analytics', {})))
+            self.payload_cache = {}
+        # 完整数据几乎每个新连接都要用，提前编码好
+        self.encoded_payload()
+        return previous
+    
+    def snapshot_payload(self, since=None):
+        """生成发给页面的数据
+        
+        since是客户端手上的版本：在版本环里时只返回变化了的候选人（changed）、
+        消失的候选人编号（removed）和变化了的分析结果；否则返回完整数据。
+        analysis里的top_candidates只给编号，不再重复一份候选人数据。
+        """
+        with self.lock:
+            data = self.current_data
+            version = self.version
+            base = next((entry for entry in self.versions if entry[0] == since), None)
+        if data is None:
+            return None
+        
+        analysis = dict(data['analysis'], top_candidates=[c['number'] for c in data['analysis']['top_candidates']])
+        payload = {'version': version, 'analysis': analysis, 'meta': self.snapshot_meta()}
+        analytics = data.get('analytics', {})
+        
+        if base is None:
+            payload.update(full=True, candidates=data['candidates'], analytics=analytics)
+            return payload
+        
+        _, base_index, base_analytics = base
+        numbers = {c['number'] for c in data['candidates']}
+        payload.update(
+            full=False,
+            base_version=since,
+            changed=[c for c in data['candidates'] if base_index.get(c['number']) != self.candidate_key(c)],
+            removed=[number for number in base_index if number not in numbers],
+            analytics={k: v for k, v in analytics.items() if base_analytics.get(k) != v}
+        )
+        return payload
+    
+    def snapshot_meta(self):
+        """随数据一起发送的元信息；页面根据last_update_ts自己计算数据新旧，响应体因此可以缓存"""
+        return {
+            'last_update': self.last_update.strftime("%Y-%m-%d %H:%M:%S") if self.last_update else None,
+            'last_update_ts': self.last_update.timestamp() if self.last_update else None,
+            'update_interval': self.update_interval,
+            'warm_start': self.warm,
+        }
+    
+    def encoded_payload(self, since=None):
+        """snapshot_payload的编码缓存：每个版本、每个基准版本只序列化和压缩一次"""
+        with self.lock:
+            version = self.version
+            if not any(entry[0] == since for entry in self.versions):
+                since = None
+            entry = self.payload_cache.get((version, since))
+        if entry is not None:
+            return entry
+        
+        payload = self.snapshot_payload(since)
+        if payload is None:
+            return None
+        entry = EncodedBody.from_json(payload)
+        with self.lock:
+            if payload['version'] == self.version:
+                self.payload_cache[(payload['version'], since)] = entry
+        return entry
+    
+    def publish(self, previous_version):
+        """把相对上一版本的增量推送给所有SSE连接"""
+        entry = self.encoded_payload(since=previous_version)
+        clients = self.broadcaster.publish('snapshot', entry.text)
+        if clients:
+            print(f"📡 已推送给 {clients} 个页面")
+    
+    def deadline(self):
+        """投票截止时间（Unix时间戳），没配置时返回None"""
+        deadline = VOTE_DEADLINES.get(int(self.vote_id)) if self.vote_id.isdigit() else None
+        return parse_time_param(deadline) if deadline else None
+    
+    def update_analytics(self, result):
+        """把新快照追加到分析矩阵，返回分析结果（按编号索引），没有numpy时返回None"""
+        if load_numpy() is None:
+            return None
+        if self.analytics is None:
+            self.analytics = VoteAnalytics(self.deadline())
+            if self.history is not None:
+                self.analytics.load_history(self.history, self.vote_id)
+        self.analytics.update(time.time(), result['candidates'])
+        return {str(number): stats for number, stats in self.analytics.compute().items()}
+    
     def update_data(self):
-        """更新数据"""
-        print("🔄 正在更新投票数据...")
+        """更新数据，并记录采集结果和耗时"""
+        start = time.perf_counter()
+        outcome = self.collect()
+        METRICS.inc('bnuvote_scrapes_total', poll=self.vote_id, outcome=outcome)
+        METRICS.observe('bnuvote_scrape_duration_seconds', time.perf_counter() - start, poll=self.vote_id)
+    
+    def collect(self):
+        """采集一次数据，返回'changed'、'unchanged'或'failed'"""
+        print(f"🔄 正在更新投票数据 (id={self.vote_id})...")
         try:
-            solver = BNUVoteSolver()
-            result = solver.run("学号", "密码")
+            if POLL_MODE == "http":
+                result = self.update_via_http()
+            else:
+                result = self.scrape_with_browser()
             
             if result:
-                self.current_data = result
-                self.last_update = datetime.now()
+                self.update_interval = self.pacer.observe(time.time(), result['analysis']['total_votes'], self.deadline())
+                if result is self.current_data:
+                    # 采集端发现票数没变化时原样返回上次的结果：不写历史、不重新分析、不推送快照
+                    self.last_checked = datetime.now()
+                    self.broadcaster.publish('checked', {'last_checked_ts': self.last_checked.timestamp()})
+                    self.touch_snapshot()
+                    print("💤 票数没有变化，只更新检查时间")
+                    return 'unchanged'
+                # 先写历史、算好分析结果，再和版本号一起换上，请求不会看到缺分析结果的新数据
+                now = datetime.now()
+                if self.history is not None:
+                    try:
+                        written = self.history.append(self.vote_id, result['candidates'], now.timestamp())
+                        print(f"🗄️ 历史记录写入 {written} 个变化")
+                    except sqlite3.Error as e:
+                        print(f"⚠️ 写入历史记录失败: {e}")
+                analytics = self.update_analytics(result)
+                self.last_checked = now
+                previous_version = self.record_version(result, last_update=now, analytics=analytics)
                 print(f"✅ 数据更新成功，时间: {self.last_update}")
-            else:
-                print("❌ 数据更新失败")
+                self.publish(previous_version)
+                self.save_snapshot()
+                return 'changed'
+            print("❌ 数据更新失败")
         except Exception as e:
             print(f"❌ 更新数据时出错: {e}")
+        delay = self.pacer.on_failure(time.time())
+        print(f"⏳ 连续失败 {self.pacer.failures} 次，{delay:.0f}秒后重试")
+        return 'failed'
+
+# 恢复登录会话时在新页面里写回localStorage，参数依次是 {源: {键: 值}}、标记键、会话文件修改时间
+STORAGE_SEED_KEY = "bnuvote_session_seeded"
+STORAGE_SEED_SCRIPT = """
+(function() {
+    var items = %s[location.origin], marker = %s, mtime = %s;
+    if (!items) return;
+    try {
+        if (Number(localStorage.getItem(marker) || 0) >= mtime) return;
+        for (var key in items) localStorage.setItem(key, items[key]);
+        localStorage.setItem(marker, String(mtime));
+    } catch (e) {}
+})();
+"""
+
+# 一次execute_script读出所有候选人的原始文本，避免每个候选人6次WebDriver往返
+BULK_EXTRACT_SCRIPT = """
+var items = document.querySelectorAll('.info-item');
+var rows = [];
+for (var i = 0; i < items.length; i++) {
+    var item = items[i];
+    var detail = item.querySelector('.detail');
+    var p = detail ? detail.querySelector('p') : null;
+    var voteBox = item.querySelector('.vote-box');
+    var num = voteBox ? voteBox.querySelector('.num') : null;
+    if (!p || !num) {
+        rows.push(null);
+        continue;
+    }
+    var btn = item.querySelector('.btn-vote');
+    var img = item.querySelector('img');
+    var imgUrl = '';
+    if (img) {
+        imgUrl = img.getAttribute('src') ? img.src : (img.getAttribute('data-src') || '');
+    }
+    rows.push([p.innerText, num.innerText, btn ? btn.innerText : null, imgUrl]);
+}
+return rows;
+"""
+
+# 票数区域的指纹：所有候选人文本和图片地址的FNV-1a哈希，一次调用就能判断页面有没有变化
+FINGERPRINT_SCRIPT = """
+var items = document.querySelectorAll('.info-item');
+var h = 2166136261;
+for (var i = 0; i < items.length; i++) {
+    var img = items[i].querySelector('img');
+    var text = items[i].textContent + '|' + (img ? (img.getAttribute('src') || img.getAttribute('data-src') || '') : '');
+    for (var j = 0; j < text.length; j++) {
+        h ^= text.charCodeAt(j);
+        h = Math.imul(h, 16777619);
+    }
+}
+return items.length + ':' + (h >>> 0);
+"""
+
+def parse_candidate_name(name_text):
+    """解析编号和姓名 (格式: "1号  陈依皓")"""
+    if "号" in name_text:
+        number_part = name_text.split("号")[0].strip()
+        name_part = name_text.split("号")[1].strip()
+        return int(number_part), name_part
+    return 0, name_text
+
+def parse_vote_count(vote_text):
+    """解析票数 (格式: "667票")"""
+    if "票" in vote_text:
+        return int(vote_text.replace("票", "").strip())
+    return int(vote_text)
+
+def build_candidate(name_text, vote_text, vote_status, img_url):
+    """由页面上读到的原始文本构造候选人数据"""
+    candidate_number, candidate_name = parse_candidate_name(name_text)
+    return {
+        'number': candidate_number,
+        'name': candidate_name,
+        'votes': parse_vote_count(vote_text),
+        'vote_status': vote_status if vote_status is not None else "未知",
+        'image_url': img_url or "",
+        'rank': 0  # 稍后排序
+    }
+
+def analyze_vote_results(candidates_data):
+    """分析投票结果
+    
+    各提取器返回的数据已经按票数从高到低排好，这里只在顺序不对时才重新排序，
+    统计量一次遍历算完。
+    """
+    if not candidates_data:
+        return None
+    
+    if any(a['votes'] < b['votes'] for a, b in zip(candidates_data, candidates_data[1:])):
+        candidates_data.sort(key=lambda x: x['votes'], reverse=True)
+    
+    # 计算排名和总票数
+    total_votes = 0
+    for i, candidate in enumerate(candidates_data, 1):
+        candidate['rank'] = i
+        total_votes += candidate['votes']
+    
+    analysis = {
+        'total_candidates': len(candidates_data),
+        'total_votes': total_votes,
+        'average_votes': round(total_votes / len(candidates_data), 2),
+        'max_votes': candidates_data[0]['votes'],
+        'min_votes': candidates_data[-1]['votes'],
+        'top_candidates': candidates_data[:5],  # 前5名
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    
+    return analysis
 
 class BNUVoteDataExtractor:
-    def __init__(self, driver):
+    def __init__(self, driver, timer=None):
+        load_selenium()
         self.driver = driver
+        self.timer = timer or PhaseTimer()
     
     def extract_candidate_data(self):
         """从投票页面提取候选人数据"""
@@ -379,24 +2297,18 @@ class BNUVoteDataExtractor:
         
         try:
             # 等待页面加载完成
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "info-item"))
-            )
-            
-            # 查找所有候选人项目
-            candidate_items = self.driver.find_elements(By.CLASS_NAME, "info-item")
-            print(f"✅ 找到 {len(candidate_items)} 个候选人")
-            
-            candidates_data = []
-            
-            for item in candidate_items:
-                try:
-                    candidate_data = self.extract_single_candidate(item)
-                    if candidate_data:
-                        candidates_data.append(candidate_data)
-                except Exception as e:
-                    print(f"❌ 提取单个候选人数据失败: {e}")
-                    continue
+            with self.timer.phase("extract_wait"):
+                WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.CLASS_NAME, "info-item"))
+                )
+            
+            # 优先一次性批量提取，失败时退回逐个元素提取
+            with self.timer.phase("extract_bulk"):
+                candidates_data = self.extract_candidates_bulk()
+            if candidates_data is None:
+                print("⚠️ 批量提取失败，改用逐个元素提取...")
+                with self.timer.phase("extract_per_element"):
+                    candidates_data = self.extract_candidates_per_element()
             
             # 按票数排序
             candidates_data.sort(key=lambda x: x['votes'], reverse=True)
@@ -407,6 +2319,48 @@ class BNUVoteDataExtractor:
             print(f"❌ 提取候选人数据失败: {e}")
             return []
     
+    def extract_candidates_bulk(self):
+        """用一次execute_script提取所有候选人，失败返回None"""
+        try:
+            rows = self.driver.execute_script(BULK_EXTRACT_SCRIPT)
+        except Exception as e:
+            print(f"❌ 批量提取脚本执行失败: {e}")
+            return None
+        
+        print(f"✅ 找到 {len(rows)} 个候选人")
+        
+        candidates_data = []
+        for row in rows:
+            if row is None:
+                print("❌ 解析候选人元素失败: 缺少编号姓名或票数")
+                continue
+            try:
+                candidates_data.append(build_candidate(*row))
+            except ValueError as e:
+                print(f"❌ 解析候选人元素失败: {e}")
+        
+        print(f"✅ 批量提取完成: {len(candidates_data)} 个候选人")
+        return candidates_data
+    
+    def extract_candidates_per_element(self):
+        """逐个元素提取候选人数据（每个候选人需要多次WebDriver调用）"""
+        # 查找所有候选人项目
+        candidate_items = self.driver.find_elements(By.CLASS_NAME, "info-item")
+        print(f"✅ 找到 {len(candidate_items)} 个候选人")
+        
+        candidates_data = []
+        
+        for item in candidate_items:
+            try:
+                candidate_data = self.extract_single_candidate(item)
+                if candidate_data:
+                    candidates_data.append(candidate_data)
+            except Exception as e:
+                print(f"❌ 提取单个候选人数据失败: {e}")
+                continue
+        
+        return candidates_data
+    
     def extract_single_candidate(self, candidate_element):
         """提取单个候选人的数据"""
         try:
@@ -414,26 +2368,10 @@ class BNUVoteDataExtractor:
             detail_element = candidate_element.find_element(By.CLASS_NAME, "detail")
             name_text = detail_element.find_element(By.TAG_NAME, "p").text
             
-            # 解析编号和姓名 (格式: "1号  陈依皓")
-            if "号" in name_text:
-                number_part = name_text.split("号")[0].strip()
-                name_part = name_text.split("号")[1].strip()
-                candidate_number = int(number_part)
-                candidate_name = name_part
-            else:
-                candidate_number = 0
-                candidate_name = name_text
-            
             # 提取票数
             vote_box = candidate_element.find_element(By.CLASS_NAME, "vote-box")
             vote_text = vote_box.find_element(By.CLASS_NAME, "num").text
             
-            # 解析票数 (格式: "667票")
-            if "票" in vote_text:
-                votes = int(vote_text.replace("票", "").strip())
-            else:
-                votes = int(vote_text)
-            
             # 提取投票状态
             try:
                 vote_button = candidate_element.find_element(By.CLASS_NAME, "btn-vote")
@@ -448,16 +2386,9 @@ class BNUVoteDataExtractor:
             except:
                 img_url = ""
             
-            candidate_data = {
-                'number': candidate_number,
-                'name': candidate_name,
-                'votes': votes,
-                'vote_status': vote_status,
-                'image_url': img_url,
-                'rank': 0  # 稍后排序
-            }
+            candidate_data = build_candidate(name_text, vote_text, vote_status, img_url)
             
-            print(f"   ✅ 候选人 {candidate_number}号 {candidate_name}: {votes}票")
+            print(f"   ✅ 候选人 {candidate_data['number']}号 {candidate_data['name']}: {candidate_data['votes']}票")
             return candidate_data
             
         except Exception as e:
@@ -466,33 +2397,357 @@ class BNUVoteDataExtractor:
     
     def analyze_vote_results(self, candidates_data):
         """分析投票结果"""
+        return analyze_vote_results(candidates_data)
+
+class _CandidateHTMLParser(HTMLParser):
+    """按 .info-item / .detail p / .vote-box .num / .btn-vote / img 结构解析候选人"""
+    
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []   # [(tag, classes)]
+        self.rows = []    # 每个候选人: {'name': [...], 'num': [...], 'btn': [...], 'img': ...}
+        self.item = None
+        self.item_depth = None
+        self.capture = None  # (字段名, 开始收集时的栈深度)
+    
+    def _inside(self, cls, depth_from):
+        return any(cls in classes for _, classes in self.stack[depth_from:])
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        
+        if self.item is None and 'info-item' in classes:
+            self.item = {'name': None, 'num': None, 'btn': None, 'img': None}
+            self.item_depth = len(self.stack)
+        elif self.item is not None and self.capture is None:
+            # 只取每个候选人里第一个匹配的元素，和find_element的行为一致
+            if tag == 'p' and self.item['name'] is None and self._inside('detail', self.item_depth):
+                self.item['name'] = []
+                self.capture = ('name', len(self.stack))
+            elif 'num' in classes and self.item['num'] is None and self._inside('vote-box', self.item_depth):
+                self.item['num'] = []
+                self.capture = ('num', len(self.stack))
+            elif 'btn-vote' in classes and self.item['btn'] is None:
+                self.item['btn'] = []
+                self.capture = ('btn', len(self.stack))
+        
+        if self.capture is not None and tag == 'br':
+            self.item[self.capture[0]].append("\n")
+        if self.item is not None and tag == 'img' and self.item['img'] is None:
+            self.item['img'] = attrs.get('src') or attrs.get('data-src') or ''
+        
+        if tag not in self.VOID_TAGS:
+            self.stack.append((tag, classes))
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID_TAGS:
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        # 容错：找不到对应开始标签的结束标签直接忽略，未闭合的标签一并弹出
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+        else:
+            return
+        
+        if self.capture is not None and len(self.stack) <= self.capture[1]:
+            self.capture = None
+        if self.item is not None and len(self.stack) <= self.item_depth:
+            self.rows.append(self.item)
+            self.item = None
+            self.capture = None
+    
+    def handle_data(self, data):
+        if self.capture is not None:
+            self.item[self.capture[0]].append(data)
+    
+    def close(self):
+        super().close()
+        if self.item is not None:
+            self.rows.append(self.item)
+            self.item = None
+
+class BNUVoteHTMLExtractor:
+    """从page_source快照或save_page_info保存的HTML文件离线解析投票数据
+    
+    不需要浏览器，可以放到工作线程里解析，也可以重新解析归档的页面。
+    """
+    
+    def __init__(self, html, base_url=VOTE_URL):
+        self.html = html
+        self.base_url = base_url
+    
+    @classmethod
+    def from_file(cls, path, base_url=VOTE_URL):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read(), base_url)
+    
+    @staticmethod
+    def _text(parts):
+        if parts is None:
+            return None
+        return " ".join("".join(parts).split())
+    
+    def extract_candidate_data(self):
+        """解析HTML中的候选人数据"""
+        parser = _CandidateHTMLParser()
+        try:
+            parser.feed(self.html)
+            parser.close()
+        except Exception as e:
+            print(f"❌ 解析HTML失败: {e}")
+            return []
+        
+        candidates_data = []
+        for row in parser.rows:
+            name_text = self._text(row['name'])
+            vote_text = self._text(row['num'])
+            if name_text is None or vote_text is None:
+                print("❌ 解析候选人元素失败: 缺少编号姓名或票数")
+                continue
+            img_url = urljoin(self.base_url, row['img']) if row['img'] else ""
+            try:
+                candidates_data.append(
+                    build_candidate(name_text, vote_text, self._text(row['btn']), img_url)
+                )
+            except ValueError as e:
+                print(f"❌ 解析候选人元素失败: {e}")
+        
+        # 按票数排序
+        candidates_data.sort(key=lambda x: x['votes'], reverse=True)
+        return candidates_data
+    
+    def analyze_vote_results(self, candidates_data):
+        """分析投票结果"""
+        return analyze_vote_results(candidates_data)
+    
+    def parse(self):
+        """解析并分析，返回与BNUVoteSolver.run相同结构的结果"""
+        candidates_data = self.extract_candidate_data()
         if not candidates_data:
             return None
+        return {
+            'candidates': candidates_data,
+            'analysis': self.analyze_vote_results(candidates_data)
+        }
+
+# 投票数据接口的JSON里可能出现的字段名，按优先级排列
+VOTE_JSON_FIELDS = {
+    'number': ('number', 'no', 'code', 'sort', 'id'),
+    'name': ('name', 'realname', 'title', 'nickname', 'username'),
+    'votes': ('votes', 'vote_num', 'vote_count', 'votenum', 'poll', 'polls', 'ticket', 'count', 'num'),
+    'vote_status': ('vote_status', 'status_text', 'btn_text'),
+    'image_url': ('image_url', 'img', 'image', 'avatar', 'pic', 'cover', 'thumb'),
+}
+
+def _pick_field(record, field):
+    for key in VOTE_JSON_FIELDS[field]:
+        if record.get(key) not in (None, ''):
+            return record[key]
+    return None
+
+def _find_candidate_records(payload):
+    """在JSON里找第一个像候选人列表的数组（元素带姓名和票数字段）"""
+    pending = [payload]
+    while pending:
+        node = pending.pop(0)
+        if isinstance(node, list):
+            records = [item for item in node if isinstance(item, dict)]
+            if records and all(_pick_field(r, 'name') is not None and _pick_field(r, 'votes') is not None
+                               for r in records):
+                return records
+            pending.extend(node)
+        elif isinstance(node, dict):
+            pending.extend(node.values())
+    return None
+
+def parse_vote_json(payload, base_url=VOTE_URL):
+    """把投票数据接口返回的JSON转换成候选人列表，认不出结构时返回None"""
+    records = _find_candidate_records(payload)
+    if not records:
+        return None
+    
+    candidates_data = []
+    for record in records:
+        name = str(_pick_field(record, 'name')).strip()
+        number = _pick_field(record, 'number')
+        try:
+            # 姓名字段是"1号 陈依皓"格式时以其中的编号为准（接口里的id多半是数据库主键）
+            if number is None or "号" in name:
+                parsed_number, name = parse_candidate_name(name)
+                number = parsed_number if parsed_number or number is None else number
+            status = _pick_field(record, 'vote_status')
+            img_url = _pick_field(record, 'image_url')
+            candidates_data.append({
+                'number': int(number),
+                'name': name,
+                'votes': parse_vote_count(str(_pick_field(record, 'votes')).strip()),
+                'vote_status': str(status) if status is not None else "未知",
+                'image_url': urljoin(base_url, img_url) if isinstance(img_url, str) else "",
+                'rank': 0
+            })
+        except ValueError as e:
+            print(f"❌ 解析候选人记录失败: {e}")
+    
+    candidates_data.sort(key=lambda x: x['votes'], reverse=True)
+    return candidates_data
+
+class SessionExpired(Exception):
+    """HTTP请求被重定向到登录页，需要用浏览器重新登录"""
+
+class VoteHTTPPoller:
+    """浏览器登录后接管会话，用长连接池直接请求投票数据
+    
+    优先请求数据接口（VOTE_API_URL或登录时记录的XHR地址），其次请求投票页
+    HTML。服务器支持时带上If-None-Match / If-Modified-Since，304或响应体和上次
+    完全一样时直接返回上次的结果对象，调用方据此知道票数没有变化。
+    """
+    
+    def __init__(self, page_url=VOTE_URL, api_url=VOTE_API_URL, pool_size=4, timeout=10):
+        load_requests()
+        self.page_url = page_url
+        self.api_url = api_url.format(vote_id=vote_id_from_url(page_url)) if api_url else None
+        self.discovered_urls = []
+        self.timeout = timeout
+        self.validators = {}  # url -> 条件请求头
+        self.cached = {}      # url -> 上次解析出的结果
+        self.body_hashes = {} # url -> 上次响应体的哈希，服务器不支持条件请求时用来判断有没有变化
         
-        total_votes = sum(candidate['votes'] for candidate in candidates_data)
-        max_votes = max(candidate['votes'] for candidate in candidates_data)
-        min_votes = min(candidate['votes'] for candidate in candidates_data)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'application/json, text/plain, */*',
+            'Referer': page_url,
+        })
+    
+    def load_session(self, session):
+        """加载save_session保存的cookies、User-Agent和数据接口地址"""
+        if not session:
+            return False
+        self.session.cookies.clear()
+        for cookie in session.get('cookies', []):
+            expires = cookie.get('expires')
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False),
+                expires=int(expires) if expires and expires > 0 else None
+            )
+        if session.get('user_agent'):
+            self.session.headers['User-Agent'] = session['user_agent']
+        # 只用这个投票页面上发现的接口；登录过程中的请求不可能是投票数据接口
+        api_urls = session.get('api_urls')
+        api_urls = api_urls.get(vote_id_from_url(self.page_url), []) if isinstance(api_urls, dict) else []
+        self.discovered_urls = [url for url in api_urls if "login" not in url.lower()]
+        self.validators.clear()
+        self.cached.clear()
+        self.body_hashes.clear()
+        return True
+    
+    def _check_login(self, response):
+        """请求被重定向到登录页说明会话失效"""
+        if response.status_code in (401, 403):
+            raise SessionExpired(f"HTTP {response.status_code}")
+        if response.history and "login" in response.url.lower():
+            raise SessionExpired(response.url)
+        if "text/html" in response.headers.get("Content-Type", "") and "<title>登录" in response.text:
+            raise SessionExpired(response.url)
+    
+    @staticmethod
+    def _is_json(response):
+        return "json" in response.headers.get("Content-Type", "") or response.text.lstrip()[:1] in ("{", "[")
+    
+    def _parse(self, url, response):
+        if self._is_json(response):
+            try:
+                candidates_data = parse_vote_json(response.json(), url)
+            except ValueError:
+                return None
+            if not candidates_data:
+                return None
+            return {'candidates': candidates_data, 'analysis': analyze_vote_results(candidates_data)}
+        return BNUVoteHTMLExtractor(response.text, response.url).parse()
+    
+    def fetch_url(self, url):
+        """条件请求一个地址并解析，拿不到投票数据时返回None"""
+        headers = dict(self.validators.get(url, {}))
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        METRICS.inc('bnuvote_upstream_requests_total', status=response.status_code)
+        self._check_login(response)
         
-        # 计算排名
-        sorted_candidates = sorted(candidates_data, key=lambda x: x['votes'], reverse=True)
-        for i, candidate in enumerate(sorted_candidates, 1):
-            candidate['rank'] = i
+        if response.status_code == 304 and url in self.cached:
+            return self.cached[url]
+        if response.status_code != 200:
+            return None
         
-        analysis = {
-            'total_candidates': len(candidates_data),
-            'total_votes': total_votes,
-            'average_votes': round(total_votes / len(candidates_data), 2),
-            'max_votes': max_votes,
-            'min_votes': min_votes,
-            'top_candidates': sorted_candidates[:5],  # 前5名
-            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")
-        }
+        body_hash = hashlib.blake2b(response.content, digest_size=16).digest()
+        if self.body_hashes.get(url) == body_hash and url in self.cached:
+            return self.cached[url]
         
-        return analysis
+        archive_page(vote_id_from_url(self.page_url), url, response.text,
+                     "json" if self._is_json(response) else "html")
+        result = self._parse(url, response)
+        if result:
+            self.body_hashes[url] = body_hash
+            validators = {}
+            if response.headers.get("ETag"):
+                validators["If-None-Match"] = response.headers["ETag"]
+            if response.headers.get("Last-Modified"):
+                validators["If-Modified-Since"] = response.headers["Last-Modified"]
+            self.validators[url] = validators
+            self.cached[url] = result
+        return result
+    
+    def fetch(self):
+        """拉取一次投票数据，会话失效时抛出SessionExpired"""
+        urls = [self.api_url] if self.api_url else []
+        urls += [url for url in self.discovered_urls if url != self.api_url]
+        
+        for url in urls:
+            result = self.fetch_url(url)
+            if result:
+                if url != self.api_url:
+                    print(f"🔎 找到投票数据接口: {url}")
+                    self.api_url = url
+                return result
+        
+        # 没有可用的数据接口时退回请求投票页HTML（页面由服务端渲染时有效）
+        return self.fetch_url(self.page_url)
 
 class BNUVoteSolver:
-    def __init__(self):
+    # 登录方法: (名称, 说明)，按默认尝试顺序排列
+    LOGIN_METHODS = [
+        ('javascript', "JavaScript直接登录"),
+        ('selenium', "Selenium传统登录"),
+        ('hybrid', "混合登录方法"),
+    ]
+    
+    def __init__(self, persistent=False, session_file=SESSION_FILE, profile=BROWSER_PROFILE,
+                 login_stats_file=LOGIN_STATS_FILE, locator_cache_file=LOCATOR_CACHE_FILE, vote_id=None):
+        load_selenium()
         self.driver = None
+        self.vote_url = vote_url_for(vote_id) if vote_id is not None else VOTE_URL
+        self.tabs = {}  # 投票id -> 浏览器标签页
+        self.persistent = persistent  # 为True时run()结束后不关闭浏览器
+        self.profile = BROWSER_PROFILES[profile]
+        self.session_file = session_file
+        self.session_mtime = None  # 已加载的会话文件修改时间
+        self.storage_seed = None   # 写回localStorage的新文档脚本 (标签页, 脚本id)
+        self.login_stats_file = login_stats_file
+        self.locator_cache_file = locator_cache_file
+        self.timer = PhaseTimer()
+        self.last_timings = None  # 上一次采集的阶段耗时
+        self.fingerprints = {}  # 投票地址 -> (页面指纹, 对应的采集结果)
         self.setup_driver()
     
     def setup_driver(self):
@@ -504,7 +2759,15 @@ class BNUVoteSolver:
             chrome_options.add_argument('--no-sandbox')
             chrome_options.add_argument('--disable-dev-shm-usage')
             chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1400,900')
+            chrome_options.add_argument(f"--window-size={self.profile['window_size']}")
+            if self.profile['headless']:
+                chrome_options.add_argument('--headless=new')
+            for arg in self.profile['extra_args']:
+                chrome_options.add_argument(arg)
+            if self.profile['block_images']:
+                chrome_options.add_experimental_option("prefs", {
+                    "profile.managed_default_content_settings.images": 2
+                })
             
             # 避免被检测为自动化工具
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
@@ -512,29 +2775,222 @@ class BNUVoteSolver:
             chrome_options.add_argument('--disable-blink-features=AutomationControlled')
             
             # 设置用户代理
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            
-            # 使用webdriver-manager
-            print("📥 正在配置ChromeDriver...")
-            service = Service(ChromeDriverManager().install())
+            chrome_options.add_argument(f'--user-agent={USER_AGENT}')
             
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            with self.timer.phase("setup_driver"):
+                # 使用webdriver-manager
+                print("📥 正在配置ChromeDriver...")
+                with self.timer.phase("driver_install"):
+                    service = Service(ChromeDriverManager().install())
+                
+                self.driver = webdriver.Chrome(service=service, options=chrome_options)
+                self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+                self.session_mtime = None
+                self.storage_seed = None
+                
+                # 在网络层拦截不需要的资源
+                if self.profile['blocked_urls']:
+                    self.driver.execute_cdp_cmd("Network.enable", {})
+                    self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.profile['blocked_urls']})
             
             print("✅ 浏览器初始化成功！")
             
+            # 加载上次保存的登录会话
+            with self.timer.phase("restore_session"):
+                self.restore_session()
+            
         except Exception as e:
             print(f"❌ 浏览器初始化失败: {e}")
             raise
     
+    def is_driver_alive(self):
+        """检查浏览器是否仍可用（Chrome崩溃或被关闭时返回False）"""
+        if self.driver is None:
+            return False
+        try:
+            self.driver.window_handles
+            return True
+        except WebDriverException:
+            return False
+    
+    def restart_driver(self):
+        """关闭失效的浏览器并重新初始化"""
+        self.close()
+        self.setup_driver()
+    
+    def select_vote(self, vote_id):
+        """切换到某个投票的标签页，没有的话新开一个；登录会话在标签页之间共享"""
+        self.vote_url = vote_url_for(vote_id)
+        handle = self.tabs.get(str(vote_id))
+        if handle in self.driver.window_handles:
+            self.driver.switch_to.window(handle)
+            return
+        
+        if self.tabs:
+            self.driver.switch_to.new_window('tab')
+        self.tabs[str(vote_id)] = self.driver.current_window_handle
+    
+    def close(self):
+        """关闭浏览器"""
+        if self.driver:
+            print("\n🔚 关闭浏览器...")
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"⚠️ 关闭浏览器时出错: {e}")
+            self.driver = None
+            self.tabs = {}
+    
+    def wait_until(self, condition, timeout, description):
+        """等待条件成立，成立后立即返回其结果；超时返回False而不抛异常"""
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(condition)
+        except TimeoutException:
+            print(f"⚠️ 等待{description}超时({timeout}秒)")
+            return False
+    
+    def wait_for_page_ready(self):
+        """等待页面加载完成且网络空闲"""
+        return self.wait_until(NetworkIdle(WAIT_TIMEOUTS['network_idle']),
+                               WAIT_TIMEOUTS['page_ready'], "页面加载")
+    
+    def wait_for_login_result(self, login_url):
+        """等待登录后的跳转：URL离开登录页或标题不再是登录，出现弹窗也立即结束"""
+        def login_finished(driver):
+            try:
+                url, title = driver.execute_script("return [location.href, document.title];")
+            except UnexpectedAlertPresentException:
+                return True  # 弹窗一般是错误提示，交给check_error_message处理
+            return url != login_url or "登录" not in title
+        
+        if self.wait_until(login_finished, WAIT_TIMEOUTS['login_result'], "登录跳转"):
+            self.wait_for_page_ready()
+    
+    def save_session(self):
+        """保存登录后的cookies和localStorage，供重启或下次刷新时复用"""
+        if not self.session_file:
+            return
+        try:
+            try:
+                # CDP能拿到所有域名下的cookies（包括CAS登录域）
+                cookies = self.driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+            except Exception:
+                cookies = self.driver.get_cookies()
+            
+            origin, local_storage, user_agent, api_urls = self.driver.execute_script("""
+                var items = {};
+                for (var i = 0; i < localStorage.length; i++) {
+                    var key = localStorage.key(i);
+                    if (key !== arguments[0]) items[key] = localStorage.getItem(key);
+                }
+                // 页面通过XHR/fetch请求过的地址，HTTP轮询模式从中找投票数据接口
+                var apiUrls = performance.getEntriesByType('resource')
+                    .filter(function(e) { return e.initiatorType === 'xmlhttprequest' || e.initiatorType === 'fetch'; })
+                    .map(function(e) { return e.name; });
+                return [location.origin, items, navigator.userAgent, apiUrls];
+            """, STORAGE_SEED_KEY)
+            
+            # 数据接口按投票id分开记录，保留其他投票之前发现的接口
+            previous = load_json_file(self.session_file, {}) or {}
+            known_urls = previous.get('api_urls')
+            known_urls = known_urls if isinstance(known_urls, dict) else {}
+            known_urls[vote_id_from_url(self.vote_url)] = list(dict.fromkeys(api_urls))
+            
+            save_json_file(self.session_file, {
+                'saved_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'cookies': cookies,
+                'local_storage': {origin: local_storage},
+                'user_agent': user_agent,
+                'api_urls': known_urls
+            })
+            self.session_mtime = os.path.getmtime(self.session_file)
+            print(f"💾 登录会话已保存: {len(cookies)} 个cookies")
+        except Exception as e:
+            print(f"⚠️ 保存登录会话失败: {e}")
+    
+    def restore_session(self, only_if_newer=False):
+        """把保存的cookies和localStorage加载回浏览器
+        
+        only_if_newer为True时，只有会话文件在上次加载后被更新过（例如
+        其他进程重新登录了）才重新加载。返回是否加载了会话。
+        """
+        if not self.session_file:
+            return False
+        try:
+            mtime = os.path.getmtime(self.session_file)
+        except OSError:
+            return False
+        if only_if_newer and self.session_mtime is not None and mtime <= self.session_mtime:
+            return False
+        
+        session = load_json_file(self.session_file)
+        if not session:
+            return False
+        self.session_mtime = mtime
+        
+        now = time.time()
+        cookie_keys = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires')
+        cookies = []
+        for cookie in session.get('cookies', []):
+            # 跳过已过期的cookie；会话cookie的expires为-1或不存在
+            expires = cookie.get('expires', -1)
+            if expires is not None and 0 < expires < now:
+                continue
+            param = {k: v for k, v in cookie.items() if k in cookie_keys}
+            if param.get('expires', -1) in (-1, None):
+                param.pop('expires', None)
+            cookies.append(param)
+        
+        try:
+            self.driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        except Exception as e:
+            print(f"⚠️ 加载登录会话的cookies失败: {e}")
+            return False
+        print(f"📂 已加载保存的登录会话 ({session.get('saved_at', '未知时间')})")
+        
+        # 刚启动时标签页还在about:blank，没法直接写别的源的localStorage：
+        # 注册一个新文档脚本，页面打开到对应的源时、在页面自己的脚本之前写进去
+        try:
+            self.seed_local_storage(session.get('local_storage', {}), mtime)
+        except Exception as e:
+            print(f"⚠️ 加载登录会话的localStorage失败: {e}")
+        return True
+    
+    def seed_local_storage(self, local_storage, mtime):
+        """在之后打开的页面里写回保存的localStorage
+        
+        每个源只写一次：写完记下会话文件的修改时间（STORAGE_SEED_KEY），之后的跳转和
+        更旧会话的脚本都不会覆盖页面自己改过的值。
+        """
+        if self.storage_seed is not None:
+            handle, identifier = self.storage_seed
+            self.storage_seed = None
+            if handle == self.driver.current_window_handle:
+                try:
+                    self.driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": identifier})
+                except Exception:
+                    pass
+        local_storage = {origin: items for origin, items in local_storage.items() if items}
+        if not local_storage:
+            return
+        
+        source = STORAGE_SEED_SCRIPT % (json.dumps(local_storage, ensure_ascii=False),
+                                        json.dumps(STORAGE_SEED_KEY), json.dumps(mtime))
+        identifier = self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": source})["identifier"]
+        self.storage_seed = (self.driver.current_window_handle, identifier)
+    
     def solve_login(self, username, password):
         """解决北师大登录问题"""
         print("🎯 正在解决北师大登录问题...")
         
         try:
+            # 其他进程更新过会话文件时先加载新会话
+            self.restore_session(only_if_newer=True)
+            
             # 访问投票页面
-            self.driver.get("https://onewechat.bnu.edu.cn/site/vote/index?id=1503")
-            time.sleep(5)
+            with self.timer.phase("open_vote_page"):
+                self.driver.get(self.vote_url)
+                self.wait_for_page_ready()
             
             print(f"📄 页面标题: {self.driver.title}")
             print(f"🔗 当前URL: {self.driver.current_url}")
@@ -542,7 +2998,12 @@ class BNUVoteSolver:
             # 检查是否需要登录
             if "登录" in self.driver.title:
                 print("🔐 需要登录，开始处理...")
-                return self.execute_login_sequence(username, password)
+                with self.timer.phase("login"):
+                    logged_in = self.execute_login_sequence(username, password)
+                if logged_in:
+                    self.save_session()
+                    return True
+                return False
             else:
                 print("✅ 已登录或无需登录")
                 return True
@@ -554,24 +3015,24 @@ class BNUVoteSolver:
     def execute_login_sequence(self, username, password):
         """执行登录序列"""
         try:
-            # 等待页面完全加载
-            print("⏳ 等待页面完全加载...")
-            time.sleep(5)
-            
-            # 方法1: 使用JavaScript直接设置Vue数据并调用登录方法
-            print("🔄 尝试方法1: JavaScript直接登录...")
-            if self.javascript_login(username, password):
-                return True
-            
-            # 方法2: 使用Selenium传统方式
-            print("🔄 尝试方法2: Selenium传统登录...")
-            if self.selenium_login(username, password):
-                return True
+            # 等待登录表单就绪（Vue实例或登录按钮出现）
+            print("⏳ 等待登录表单加载...")
+            self.wait_until(
+                lambda d: d.execute_script(
+                    "return typeof vm !== 'undefined' || !!document.querySelector('div.btn');"
+                ),
+                WAIT_TIMEOUTS['login_form'], "登录表单"
+            )
             
-            # 方法3: 使用混合方法
-            print("🔄 尝试方法3: 混合登录方法...")
-            if self.hybrid_login(username, password):
-                return True
+            # 按历史记录排序：上次成功的方法先试，其余方法遇到明显不适用的页面会立即返回
+            labels = dict(self.LOGIN_METHODS)
+            for i, method in enumerate(self.login_method_order(), 1):
+                print(f"🔄 尝试方法{i}: {labels[method]}...")
+                start = time.perf_counter()
+                success = getattr(self, f"{method}_login")(username, password)
+                self.record_login_result(method, success, time.perf_counter() - start)
+                if success:
+                    return True
             
             print("❌ 所有登录方法都失败了")
             return False
@@ -582,6 +3043,34 @@ class BNUVoteSolver:
             traceback.print_exc()
             return False
     
+    def login_method_order(self):
+        """最近成功过的登录方法排在前面，从未成功的保持默认顺序"""
+        stats = load_json_file(self.login_stats_file, {}) if self.login_stats_file else {}
+        default_order = [method for method, _ in self.LOGIN_METHODS]
+        return sorted(default_order, key=lambda m: (
+            -stats.get(m, {}).get('last_success_at', 0),
+            default_order.index(m)
+        ))
+    
+    def record_login_result(self, method, success, latency):
+        """记录登录方法的结果和耗时"""
+        METRICS.inc('bnuvote_login_attempts_total', method=method, outcome='success' if success else 'failure')
+        if not self.login_stats_file:
+            return
+        stats = load_json_file(self.login_stats_file, {})
+        entry = stats.setdefault(method, {'success': 0, 'failure': 0})
+        if success:
+            entry['success'] += 1
+            entry['last_success_at'] = time.time()
+        else:
+            entry['failure'] += 1
+        entry['last_latency'] = round(latency, 2)
+        try:
+            save_json_file(self.login_stats_file, stats)
+        except OSError as e:
+            print(f"⚠️ 保存登录记录失败: {e}")
+        print(f"📝 {method}登录{'成功' if success else '失败'}，耗时{latency:.2f}秒")
+    
     def javascript_login(self, username, password):
         """使用JavaScript直接登录"""
         try:
@@ -606,11 +3095,15 @@ class BNUVoteSolver:
             }}
             """
             
+            login_url = self.driver.current_url
             result = self.driver.execute_script(script)
+            if not result:
+                print("❌ 未找到Vue实例vm，跳过JavaScript登录")
+                return False
             print("✅ JavaScript登录方法已执行")
             
             # 等待登录完成
-            time.sleep(8)
+            self.wait_for_login_result(login_url)
             
             # 检查是否登录成功
             if self.check_login_success():
@@ -628,10 +3121,15 @@ class BNUVoteSolver:
             # 查找输入框并填写
             print("🔍 查找输入框...")
             
+            # 登录表单已经等待过，这里缺少输入框或按钮说明此方法不适用，直接放弃
+            if not (self.driver.find_elements(By.CSS_SELECTOR, "input[type='text']") and
+                    self.driver.find_elements(By.CSS_SELECTOR, "input[type='password']") and
+                    self.driver.find_elements(By.CSS_SELECTOR, "div.btn")):
+                print("❌ 未找到登录输入框或按钮，跳过Selenium登录")
+                return False
+            
             # 用户名输入框
-            username_input = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='text']"))
-            )
+            username_input = self.driver.find_element(By.CSS_SELECTOR, "input[type='text']")
             username_input.clear()
             username_input.send_keys(username)
             print("✅ 已填写用户名")
@@ -644,6 +3142,7 @@ class BNUVoteSolver:
             
             # 查找登录按钮
             login_button = self.driver.find_element(By.CSS_SELECTOR, "div.btn")
+            login_url = self.driver.current_url
             print("✅ 找到登录按钮")
             
             # 多种点击方式尝试
@@ -663,7 +3162,7 @@ class BNUVoteSolver:
                     print(f"❌ 点击方式 {i+1} 失败: {e}")
             
             # 等待登录完成
-            time.sleep(8)
+            self.wait_for_login_result(login_url)
             
             # 检查是否登录成功
             if self.check_login_success():
@@ -689,16 +3188,25 @@ class BNUVoteSolver:
             return false;
             """
             
+            if not self.driver.find_elements(By.CSS_SELECTOR, "div.btn"):
+                print("❌ 未找到登录按钮，跳过混合登录")
+                return False
+            
             result = self.driver.execute_script(script_set_data)
             if not result:
                 print("❌ 无法设置Vue数据")
                 return False
             
             print("✅ Vue数据设置成功")
-            time.sleep(2)
+            # 等待Vue数据绑定生效
+            self.wait_until(
+                lambda d: d.execute_script("return vm.username === arguments[0];", username),
+                WAIT_TIMEOUTS['vm_data'], "Vue数据绑定"
+            )
             
             # 使用Selenium点击登录按钮
             login_button = self.driver.find_element(By.CSS_SELECTOR, "div.btn")
+            login_url = self.driver.current_url
             
             # 尝试多种点击方式
             for i in range(3):
@@ -712,7 +3220,7 @@ class BNUVoteSolver:
                         return False
             
             # 等待登录完成
-            time.sleep(8)
+            self.wait_for_login_result(login_url)
             
             # 检查是否登录成功
             if self.check_login_success():
@@ -767,78 +3275,104 @@ class BNUVoteSolver:
             except:
                 print("⚠️ 未发现明显的错误消息")
     
+    # 查找"投票统计"按钮时依次尝试的定位方式
+    # 定位方式直接写By.XPATH / By.CSS_SELECTOR的值，类定义时还没有加载Selenium
+    STATISTICS_BUTTON_LOCATORS = [
+        ("xpath", f"//button[contains(text(), '{text}')]")
+        for text in ["查看投票统计", "投票统计", "统计结果", "查看结果", "结果统计"]
+    ] + [
+        ("css selector", selector)
+        for selector in [
+            ".btn-statistics",
+            ".vote-statistics",
+            ".statistics-btn",
+            "button[class*='statistics']",
+            "button[class*='result']"
+        ]
+    ]
+    
+    def load_cached_locator(self):
+        """读取当前投票页面缓存的统计按钮定位方式"""
+        if not self.locator_cache_file:
+            return None
+        cached = load_json_file(self.locator_cache_file, {}).get(vote_id_from_url(self.vote_url))
+        return tuple(cached) if cached else None
+    
+    def save_cached_locator(self, locator):
+        """记录当前投票页面可用的统计按钮定位方式，locator为None时删除记录"""
+        if not self.locator_cache_file:
+            return
+        cache = load_json_file(self.locator_cache_file, {})
+        vote_id = vote_id_from_url(self.vote_url)
+        if locator:
+            cache[vote_id] = list(locator)
+        else:
+            cache.pop(vote_id, None)
+        try:
+            save_json_file(self.locator_cache_file, cache)
+        except OSError as e:
+            print(f"⚠️ 保存按钮定位缓存失败: {e}")
+    
+    def try_statistics_locator(self, locator):
+        """用指定定位方式查找并点击统计按钮，返回是否进入了投票统计页面"""
+        statistics_buttons = self.driver.find_elements(*locator)
+        if not statistics_buttons:
+            return False
+        
+        statistics_button = statistics_buttons[0]
+        print(f"✅ 找到投票统计按钮: {locator[1]}")
+        
+        # 尝试点击
+        try:
+            statistics_button.click()
+            print("✅ 已点击投票统计按钮")
+        except Exception:
+            # 如果普通点击失败，使用JavaScript点击
+            self.driver.execute_script("arguments[0].click();", statistics_button)
+            print("✅ 使用JavaScript点击投票统计按钮")
+        
+        # 等待页面跳转和数据加载
+        print("⏳ 等待投票统计页面加载...")
+        if self.wait_for_statistics_loaded():
+            print("✅ 投票统计页面已加载")
+            return True
+        print("❌ 可能未成功进入投票统计页面")
+        return False
+    
     def click_vote_statistics_button(self):
         """点击投票统计按钮"""
         print("📊 正在查找投票统计按钮...")
         
         try:
-            # 等待页面加载完成
-            time.sleep(5)
-            
-            # 查找"查看投票统计"按钮 - 尝试多种可能的文本
-            possible_button_texts = ["查看投票统计", "投票统计", "统计结果", "查看结果", "结果统计"]
+            # 等待页面上出现按钮或候选人列表
+            self.wait_until(
+                lambda d: d.execute_script(
+                    "return !!document.querySelector('button, .info-item');"
+                ),
+                WAIT_TIMEOUTS['statistics_button'], "投票统计按钮"
+            )
             
-            for button_text in possible_button_texts:
+            # 先用上次成功的定位方式
+            cached = self.load_cached_locator()
+            if cached:
                 try:
-                    # 通过XPath查找包含特定文本的按钮
-                    statistics_buttons = self.driver.find_elements(By.XPATH, f"//button[contains(text(), '{button_text}')]")
-                    if statistics_buttons:
-                        statistics_button = statistics_buttons[0]
-                        print(f"✅ 找到投票统计按钮: '{button_text}'")
-                        
-                        # 尝试点击
-                        try:
-                            statistics_button.click()
-                            print("✅ 已点击投票统计按钮")
-                        except:
-                            # 如果普通点击失败，使用JavaScript点击
-                            self.driver.execute_script("arguments[0].click();", statistics_button)
-                            print("✅ 使用JavaScript点击投票统计按钮")
-                        
-                        # 等待页面跳转和数据加载
-                        print("⏳ 等待投票统计页面加载...")
-                        time.sleep(8)
-                        
-                        # 检查是否成功进入投票统计页面
-                        if self.check_vote_statistics_loaded():
-                            return True
-                        else:
-                            print("❌ 可能未成功进入投票统计页面")
-                            continue
+                    if self.try_statistics_locator(cached):
+                        return True
                 except Exception as e:
-                    print(f"❌ 查找 '{button_text}' 按钮失败: {e}")
-                    continue
+                    print(f"❌ 缓存的定位方式出错: {e}")
+                print("🔄 缓存的按钮定位已失效，重新查找...")
+                self.save_cached_locator(None)
             
-            # 如果通过文本找不到，尝试通过CSS选择器
-            print("🔄 尝试通过CSS选择器查找统计按钮...")
-            try:
-                # 可能的按钮选择器
-                possible_selectors = [
-                    ".btn-statistics",
-                    ".vote-statistics",
-                    ".statistics-btn",
-                    "button[class*='statistics']",
-                    "button[class*='result']"
-                ]
-                
-                for selector in possible_selectors:
-                    try:
-                        statistics_buttons = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                        if statistics_buttons:
-                            statistics_button = statistics_buttons[0]
-                            print(f"✅ 通过选择器找到投票统计按钮: {selector}")
-                            
-                            self.driver.execute_script("arguments[0].click();", statistics_button)
-                            print("✅ 使用JavaScript点击投票统计按钮")
-                            
-                            time.sleep(8)
-                            
-                            if self.check_vote_statistics_loaded():
-                                return True
-                    except:
-                        continue
-            except Exception as e:
-                print(f"❌ 通过CSS选择器查找失败: {e}")
+            # 依次尝试按钮文本和CSS选择器
+            for locator in self.STATISTICS_BUTTON_LOCATORS:
+                if locator == cached:
+                    continue
+                try:
+                    if self.try_statistics_locator(locator):
+                        self.save_cached_locator(locator)
+                        return True
+                except Exception as e:
+                    print(f"❌ 查找 '{locator[1]}' 按钮失败: {e}")
             
             print("❌ 未找到投票统计按钮")
             # 保存当前页面用于调试
@@ -849,28 +3383,23 @@ class BNUVoteSolver:
             print(f"❌ 点击投票统计按钮失败: {e}")
             return False
     
-    def check_vote_statistics_loaded(self):
-        """检查投票统计页面是否加载成功"""
+    def wait_for_statistics_loaded(self):
+        """等待候选人票数渲染出来"""
+        return self.wait_until(
+            lambda d: d.execute_script("""
+                var nums = document.querySelectorAll('.info-item .vote-box .num');
+                return nums.length > 0 && nums[nums.length - 1].textContent.trim() !== '';
+            """),
+            WAIT_TIMEOUTS['statistics_loaded'], "投票统计数据"
+        )
+    
+    def page_fingerprint(self):
+        """计算当前页面票数区域的指纹，失败时返回None（退回完整提取）"""
         try:
-            # 检查是否出现投票数据相关的元素
-            checks = [
-                lambda: self.driver.find_elements(By.CLASS_NAME, "info-item"),
-                lambda: self.driver.find_elements(By.CLASS_NAME, "vote-box"),
-                lambda: self.driver.find_elements(By.XPATH, "//*[contains(text(), '候选人')]"),
-                lambda: self.driver.find_elements(By.XPATH, "//*[contains(text(), '票')]")
-            ]
-            
-            for check in checks:
-                if check():
-                    print("✅ 投票统计页面已加载")
-                    return True
-            
-            print("❌ 投票统计页面可能未完全加载")
-            return False
-            
-        except Exception as e:
-            print(f"检查投票统计页面失败: {e}")
-            return False
+            return self.driver.execute_script(FINGERPRINT_SCRIPT)
+        except WebDriverException as e:
+            print(f"⚠️ 计算页面指纹失败: {e}")
+            return None
     
     def save_page_info(self, filename_prefix):
         """保存页面信息用于调试"""
@@ -897,26 +3426,54 @@ class BNUVoteSolver:
         try:
             # 先点击投票统计按钮
             print("🖱️ 尝试点击投票统计按钮...")
-            if not self.click_vote_statistics_button():
+            with self.timer.phase("statistics_button"):
+                clicked = self.click_vote_statistics_button()
+            if not clicked:
                 print("⚠️ 无法点击投票统计按钮，尝试直接从当前页面提取数据...")
             
+            # 票数区域和上次一样时直接返回上次的结果
+            with self.timer.phase("fingerprint"):
+                self.wait_for_statistics_loaded()
+                fingerprint = self.page_fingerprint()
+            cached = self.fingerprints.get(self.vote_url)
+            if fingerprint and cached and cached[0] == fingerprint:
+                print("💤 页面指纹没有变化，跳过提取和分析")
+                return cached[1]
+            
+            # 需要页面源码时只取一次：html提取和页面存档共用
+            page_source = None
+            if EXTRACT_BACKEND == "html" or page_archive is not None:
+                with self.timer.phase("page_source"):
+                    page_source = self.driver.page_source
+            if page_archive is not None:
+                with self.timer.phase("archive"):
+                    archive_page(vote_id_from_url(self.vote_url), self.driver.current_url, page_source)
+            
             # 创建数据提取器
-            extractor = BNUVoteDataExtractor(self.driver)
+            if EXTRACT_BACKEND == "html":
+                # 只取一次页面快照，之后的解析不再访问浏览器
+                extractor = BNUVoteHTMLExtractor(page_source, self.driver.current_url)
+            else:
+                extractor = BNUVoteDataExtractor(self.driver, self.timer)
             
             # 提取候选人数据
-            candidates_data = extractor.extract_candidate_data()
+            with self.timer.phase("extract"):
+                candidates_data = extractor.extract_candidate_data()
             
             if not candidates_data:
                 print("❌ 未能提取到候选人数据")
                 return None
             
             # 分析数据
-            analysis = extractor.analyze_vote_results(candidates_data)
+            with self.timer.phase("analyze"):
+                analysis = extractor.analyze_vote_results(candidates_data)
             
             result = {
                 'candidates': candidates_data,
                 'analysis': analysis
             }
+            if fingerprint:
+                self.fingerprints[self.vote_url] = (fingerprint, result)
             
             return result
             
@@ -926,6 +3483,57 @@ class BNUVoteSolver:
             traceback.print_exc()
             return None
     
+    def print_summary(self, result):
+        """打印采集结果摘要"""
+        if result:
+            print(f"\n✅ 数据采集成功！")
+            print(f"📊 总票数: {result['analysis']['total_votes']}")
+            print(f"👥 候选人数量: {len(result['candidates'])}")
+            
+            # 显示前5名
+            print("\n🏆 前5名候选人:")
+            for i, candidate in enumerate(result['analysis']['top_candidates'], 1):
+                print(f"   {i}. {candidate['number']}号 {candidate['name']}: {candidate['votes']}票")
+        else:
+            print("\n❌ 数据提取失败")
+    
+    def report_timings(self):
+        """打印本次采集的阶段耗时并开始新一轮计时"""
+        self.timer.report()
+        self.last_timings = self.timer
+        self.timer = PhaseTimer()
+    
+    def refresh(self, username, password, vote_id=None):
+        """持久模式下刷新数据：复用已登录的浏览器，只重新加载投票页面
+        
+        会话过期时solve_login会检测到登录页并重新登录；
+        Chrome崩溃时重建浏览器后再试一次。指定vote_id时在该投票自己的标签页中刷新。
+        """
+        for attempt in range(2):
+            if not self.is_driver_alive():
+                print("♻️ 浏览器不可用，正在重建会话...")
+                self.restart_driver()
+            
+            result = None
+            try:
+                if vote_id is not None:
+                    self.select_vote(vote_id)
+                if self.solve_login(username, password):
+                    result = self.extract_vote_data_after_login()
+                else:
+                    print("❌ 登录失败")
+            except Exception as e:
+                print(f"❌ 刷新数据出错: {e}")
+            
+            # 浏览器仍然存活说明失败与会话无关，不必重建
+            if result or self.is_driver_alive():
+                self.print_summary(result)
+                self.report_timings()
+                return result
+        
+        self.report_timings()
+        return None
+    
     def run(self, username, password):
         """运行爬虫"""
         try:
@@ -942,18 +3550,8 @@ class BNUVoteSolver:
             
             # 提取投票数据（会先尝试点击投票统计按钮）
             result = self.extract_vote_data_after_login()
-            
-            if result:
-                print(f"\n✅ 数据采集成功！")
-                print(f"📊 总票数: {result['analysis']['total_votes']}")
-                print(f"👥 候选人数量: {len(result['candidates'])}")
-                
-                # 显示前5名
-                print("\n🏆 前5名候选人:")
-                for i, candidate in enumerate(result['analysis']['top_candidates'], 1):
-                    print(f"   {i}. {candidate['number']}号 {candidate['name']}: {candidate['votes']}票")
-            else:
-                print("\n❌ 数据提取失败")
+            self.print_summary(result)
+            self.report_timings()
             
             return result
             
@@ -963,55 +3561,417 @@ class BNUVoteSolver:
             traceback.print_exc()
             return None
         finally:
-            if self.driver:
-                print("\n🔚 关闭浏览器...")
-                self.driver.quit()
+            if not self.persistent:
+                self.close()
+
+class AdaptiveInterval:
+    """根据票数变化速度决定下一次采集的间隔
+    
+    每次采集成功后用总票数的增长速度估算多久能涨POLL_TARGET_VOTES票，和当前间隔取平均；
+    票数没变化时每次放慢一半，临近截止时直接用最短间隔。采集失败时按min间隔指数退避。
+    """
+    
+    IDLE_SLOWDOWN = 1.5
+    
+    def __init__(self, initial, min_interval, max_interval):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = initial
+        self.failures = 0
+        self.retry_at = 0.0  # 失败退避期间下一次允许采集的时间
+        self.last = None     # (时间戳, 总票数)
+    
+    def observe(self, ts, total_votes, deadline=None):
+        """记录一次成功采集，返回新的采集间隔"""
+        self.failures = 0
+        self.retry_at = 0.0
+        if self.last is not None and ts > self.last[0]:
+            rate = (total_votes - self.last[1]) / (ts - self.last[0])
+            if rate > 0:
+                self.interval = (self.interval + POLL_TARGET_VOTES / rate) / 2
+            else:
+                self.interval *= self.IDLE_SLOWDOWN
+        self.last = (ts, total_votes)
+        
+        if deadline is not None and 0 <= deadline - ts <= 2 * self.max_interval:
+            self.interval = self.min_interval
+        self.interval = max(self.min_interval, min(self.max_interval, self.interval))
+        return self.interval
+    
+    def on_failure(self, ts):
+        """记录一次失败，返回退避时间"""
+        self.failures += 1
+        delay = min(POLL_MAX_BACKOFF, self.min_interval * 2 ** (self.failures - 1))
+        self.retry_at = ts + delay
+        return delay
+    
+    def next_delay(self):
+        return self.retry_at - time.time() if self.failures else self.interval
+
+class PollScheduler:
+    """后台轮询所有投票：每个投票采集完成后按它的自适应间隔（加随机抖动）再次采集
+    
+    采集本身在VoteDataManager.refresh的后台线程里进行，并发数受浏览器池限制；
+    所有投票合计的采集次数不超过每小时预算。
+    """
+    
+    def __init__(self, managers, budget_per_hour=None):
+        self.managers = managers
+        self.next_due = {vote_id: 0 for vote_id in managers}
+        self.budget = budget_per_hour or POLL_INTERVALS[POLL_MODE]['budget_per_hour']
+        self.recent = deque()  # 最近一小时内发起采集的时间
+        self.wakeup = threading.Event()
+    
+    def _on_done(self, manager):
+        delay = max(0.0, manager.pacer.next_delay())
+        delay *= random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        self.next_due[manager.vote_id] = time.time() + delay
+        self.wakeup.set()
+    
+    def _budget_wait(self, now):
+        """还能不能发起采集：返回需要等待的秒数，0表示可以"""
+        while self.recent and self.recent[0] <= now - 3600:
+            self.recent.popleft()
+        if len(self.recent) < self.budget:
+            return 0.0
+        return self.recent[0] + 3600 - now
+    
+    def run(self):
+        while True:
+            self.wakeup.clear()  # 先清再检查，检查期间完成的采集会让下面的wait立即返回
+            now = time.time()
+            for vote_id, manager in self.managers.items():
+                if self.next_due[vote_id] <= now:
+                    wait = self._budget_wait(now)
+                    if wait > 0:
+                        print(f"🐢 已达到每小时{self.budget}次的采集上限，{wait:.0f}秒后再采集")
+                        self.next_due[vote_id] = now + wait
+                        continue
+                    self.recent.append(now)
+                    self.next_due[vote_id] = float('inf')  # 采集完成后再排期
+                    future = manager.refresh(wait=False)
+                    future.add_done_callback(lambda _, m=manager: self._on_done(m))
+            
+            # 所有投票都在采集时没有下一个时间点（inf），一直等到有采集完成
+            next_due = min(self.next_due.values(), default=float('inf'))
+            self.wakeup.wait(None if next_due == float('inf') else max(0.0, next_due - time.time()))
 
 # 创建Flask应用
 app = Flask(__name__)
-data_manager = VoteDataManager()
+browser_pool = BrowserPool()
+history_store = VoteHistoryStore(HISTORY_DB) if HISTORY_DB else None
+page_archive = PageArchive(PAGE_ARCHIVE_DIR) if PAGE_ARCHIVE_DIR else None
+data_managers = {str(vote_id): VoteDataManager(vote_id, browser_pool, history=history_store)
+                 for vote_id in VOTE_IDS}
+data_manager = data_managers[str(VOTE_IDS[0])]
+
+METRICS.gauge('bnuvote_data_age_seconds', "距上次成功采集的秒数",
+              lambda: {(('poll', vote_id),): m.data_age() for vote_id, m in data_managers.items()})
+METRICS.gauge('bnuvote_poll_interval_seconds', "当前的自适应采集间隔",
+              lambda: {(('poll', vote_id),): m.update_interval for vote_id, m in data_managers.items()})
+METRICS.gauge('bnuvote_consecutive_failures', "连续采集失败次数",
+              lambda: {(('poll', vote_id),): m.pacer.failures for vote_id, m in data_managers.items()})
+METRICS.gauge('bnuvote_sse_clients', "当前连接的SSE页面数",
+              lambda: {(('poll', vote_id),): len(m.broadcaster.clients) for vote_id, m in data_managers.items()})
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    METRICS.inc('bnuvote_http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    # SSE长连接的耗时没有意义
+    if response.mimetype != 'text/event-stream':
+        METRICS.observe('bnuvote_http_request_duration_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus格式的运行指标"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+def vote_title(vote_id):
+    return VOTE_TITLES.get(int(vote_id), f"投票 {vote_id}") if str(vote_id).isdigit() else f"投票 {vote_id}"
+
+# 每个投票的页面只渲染、压缩一次
+dashboard_cache = {}
+
+def render_dashboard(vote_id):
+    page = dashboard_cache.get(vote_id)
+    if page is None:
+        polls = [(str(v), vote_title(v)) for v in VOTE_IDS]
+        html = render_template_string(HTML_TEMPLATE, vote_id=vote_id, title=vote_title(vote_id), polls=polls)
+        page = dashboard_cache[vote_id] = EncodedBody(html.encode('utf-8'), 'text/html; charset=utf-8')
+    return page.response(request)
 
 @app.route('/')
 def index():
     """主页"""
-    return render_template_string(HTML_TEMPLATE)
+    return render_dashboard(data_manager.vote_id)
+
+@app.route('/vote/<vote_id>')
+def vote_dashboard(vote_id):
+    """单个投票的页面"""
+    if vote_id not in data_managers:
+        return "未监控该投票", 404
+    return render_dashboard(vote_id)
+
+def vote_data_response(manager):
+    data = manager.get_data()
+    meta = manager.get_meta()
+    if data:
+        entry = manager.encoded_payload(request.args.get('since', type=int))
+        return entry.response(request, {'X-Data-Age': str(meta['age_seconds']),
+                                        'X-Last-Checked': str(meta['last_checked'] or '')})
+    elif meta['refreshing']:
+        return jsonify({'error': '数据正在加载中', 'meta': meta}), 503
+    else:
+        return jsonify({'error': '无法获取数据', 'meta': meta}), 500
 
 @app.route('/api/vote-data')
 def api_vote_data():
     """API接口，返回投票数据"""
-    data = data_manager.get_data()
-    if data:
-        return jsonify(data)
-    else:
-        return jsonify({'error': '无法获取数据'}), 500
+    return vote_data_response(data_manager)
+
+@app.route('/api/vote-data/<vote_id>')
+def api_vote_data_by_id(vote_id):
+    """API接口，返回指定投票的数据"""
+    manager = data_managers.get(vote_id)
+    if manager is None:
+        return jsonify({'error': '未监控该投票'}), 404
+    return vote_data_response(manager)
+
+@app.route('/api/stream')
+@app.route('/api/stream/<vote_id>')
+def api_stream(vote_id=None):
+    """SSE推送接口：连接时先发送当前数据，之后每次采集到新数据推送一次"""
+    manager = data_managers.get(vote_id) if vote_id else data_manager
+    if manager is None:
+        return jsonify({'error': '未监控该投票'}), 404
+    
+    def stream():
+        client = manager.broadcaster.subscribe()
+        try:
+            if manager.get_data():
+                yield SnapshotBroadcaster.format_event('snapshot', manager.encoded_payload().text)
+            while True:
+                try:
+                    yield client.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": ping\n\n"
+        finally:
+            manager.broadcaster.unsubscribe(client)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def parse_time_param(value):
+    """解析时间参数：Unix时间戳或"YYYY-MM-DD HH:MM[:SS]"，为空返回None"""
+    if not value:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return int(datetime.strptime(value, fmt).timestamp())
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的时间: {value}")
+
+@app.route('/api/history')
+@app.route('/api/history/<vote_id>')
+def api_history(vote_id=None):
+    """票数历史接口：返回服务端降采样后的候选人票数曲线
+    
+    参数: candidate=编号[,编号...]（默认当前前5名） from / to（时间戳或日期时间）
+    points=每条曲线最多点数（默认500）
+    """
+    if history_store is None:
+        return jsonify({'error': '未开启历史记录'}), 404
+    vote_id = vote_id or request.args.get('poll') or data_manager.vote_id
+    manager = data_managers.get(vote_id)
+    if manager is None:
+        return jsonify({'error': '未监控该投票'}), 404
+    
+    try:
+        numbers = [int(n) for n in request.args.get('candidate', '').split(',') if n.strip()]
+        start = parse_time_param(request.args.get('from'))
+        end = parse_time_param(request.args.get('to'))
+        points = max(3, min(int(request.args.get('points', 500)), MAX_HISTORY_POINTS))
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {e}'}), 400
+    
+    if not numbers and manager.current_data:
+        numbers = [c['number'] for c in manager.current_data['candidates'][:5]]
+    
+    now = int(time.time())
+    end_ts = min(end, now) if end is not None else now
+    series = history_store.query(vote_id, numbers or None, start, end_ts)
+    names = history_store.candidate_names(vote_id)
+    
+    result = []
+    for number in numbers or sorted(series):
+        series_points = series.get(number, [])
+        if series_points:
+            # 票数在两个记录点之间不变：把开头对齐到from，把最后的票数延续到to
+            if start is not None and series_points[0][0] < start:
+                series_points[0] = (start, series_points[0][1])
+            if series_points[-1][0] < end_ts:
+                series_points.append((end_ts, series_points[-1][1]))
+        result.append({
+            'number': number,
+            'name': names.get(number, ''),
+            'points': lttb(series_points, points)
+        })
+    
+    return jsonify({'poll_id': vote_id, 'from': start, 'to': end_ts, 'series': result})
 
 def start_background_updater():
     """启动后台数据更新线程"""
-    def update_loop():
+    scheduler = PollScheduler(data_managers)
+    update_thread = threading.Thread(target=scheduler.run, daemon=True)
+    update_thread.start()
+    print(f"🔄 后台数据更新线程已启动，监控 {len(data_managers)} 个投票")
+
+def start_snapshot_watcher(interval=1.0):
+    """web-only模式：定时检查采集进程写的快照文件，有变化就加载并推送给页面"""
+    def watch():
         while True:
-            data_manager.update_data()
-            time.sleep(300)  # 5分钟更新一次
+            for manager in data_managers.values():
+                manager.sync_snapshot()
+            time.sleep(interval)
     
-    update_thread = threading.Thread(target=update_loop, daemon=True)
-    update_thread.start()
-    print("🔄 后台数据更新线程已启动")
+    for manager in data_managers.values():
+        manager.follow_snapshots()
+    threading.Thread(target=watch, daemon=True).start()
+    print(f"👀 web-only模式：从快照文件读取 {len(data_managers)} 个投票的数据")
+
+def parse_saved_pages(paths):
+    """离线解析保存的HTML页面并打印结果"""
+    for path in paths:
+        print(f"📄 解析 {path}")
+        result = BNUVoteHTMLExtractor.from_file(path).parse()
+        if result:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print("❌ 未能提取到候选人数据")
+
+def replay_archive(archive, poll_ids=None, backfill=None):
+    """把存档的页面按时间顺序重新解析、分析一遍
+    
+    用来离线测解析速度、检查解析器改动；backfill是历史库路径时把解析结果按当时的时间合并进去
+    （比如修好解析器后补历史），可以补在已有记录之前或中间，同一时刻以库里原有的点为准。
+    """
+    entries = archive.entries(poll_ids)
+    if not entries:
+        print(f"❌ {archive.directory} 里没有存档页面")
+        return
+    store = VoteHistoryStore(backfill) if backfill else None
+    print(f"▶️ 重放 {len(entries)} 次采集...")
+    
+    parsed = failed = missing = written = 0
+    parse_time = 0.0
+    snapshots = {}  # 投票id -> [(时间戳, 候选人列表), ...]
+    for entry in entries:
+        body = archive.load(entry['hash'])
+        if body is None:
+            missing += 1
+            continue
+        start = time.perf_counter()
+        result = parse_archived_page(entry, body)
+        parse_time += time.perf_counter() - start
+        if not result:
+            failed += 1
+            print(f"❌ 解析失败: {datetime.fromtimestamp(entry['ts']):%Y-%m-%d %H:%M:%S} 投票{entry['poll']} {entry['hash']}")
+            continue
+        parsed += 1
+        if store is not None:
+            snapshots.setdefault(entry['poll'], []).append((entry['ts'], result['candidates']))
+    
+    print(f"✅ 解析成功 {parsed} 次，失败 {failed} 次，页面已被清理 {missing} 次")
+    if parsed or failed:
+        print(f"⏱️ 解析总耗时 {parse_time:.2f}秒，平均每页 {parse_time / (parsed + failed) * 1000:.1f}毫秒")
+    if store is not None:
+        for poll_id, poll_snapshots in snapshots.items():
+            written += store.backfill(poll_id, poll_snapshots)
+        store.close()
+        print(f"🗄️ 向 {backfill} 写入了 {written} 个历史点")
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="北师大投票数据监控系统")
+    parser.add_argument("--parse", nargs="+", metavar="HTML",
+                        help="离线解析保存的页面文件，不启动浏览器和Web服务器")
+    parser.add_argument("--replay", nargs="*", metavar="VOTE_ID",
+                        help="重放页面存档（可以只重放指定投票），不启动浏览器和Web服务器")
+    parser.add_argument("--archive", metavar="DIR", default=PAGE_ARCHIVE_DIR or "bnuvote_pages",
+                        help="重放时使用的存档目录，默认是PAGE_ARCHIVE_DIR")
+    parser.add_argument("--backfill", metavar="DB",
+                        help="重放时把解析结果写进这个历史库")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--web-only", action="store_true",
+                      help="只提供网页，数据来自另一个 --scraper-only 进程写的快照文件（不需要Selenium）")
+    mode.add_argument("--scraper-only", action="store_true",
+                      help="只在后台采集并写快照文件和历史库，不启动Web服务器")
+    args = parser.parse_args()
+    
+    if args.parse:
+        parse_saved_pages(args.parse)
+        return
+    if args.replay is not None:
+        replay_archive(PageArchive(args.archive), args.replay, args.backfill)
+        return
+    
+    if (args.web_only or args.scraper_only) and not SNAPSHOT_FILE:
+        print("❌ web-only / scraper-only 模式通过快照文件交换数据，请先设置SNAPSHOT_FILE")
+        return
+    
     print("=" * 60)
     print("🌐 北师大投票数据监控系统")
     print("=" * 60)
     
-    # 启动后台数据更新
-    start_background_updater()
+    if args.scraper_only:
+        print(f"🔄 只采集模式：监控 {len(data_managers)} 个投票，数据写入快照文件")
+        try:
+            PollScheduler(data_managers).run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            browser_pool.close_all()
+        return
+    
+    # 启动后台数据更新；web-only模式下只跟随快照文件
+    if args.web_only:
+        start_snapshot_watcher()
+    else:
+        start_background_updater()
     
     # 启动Flask服务器
     print("🚀 启动Web服务器...")
     print("📍 访问地址: http://localhost:5000")
-    print("⏰ 数据每5分钟自动更新一次")
-    print("🔄 网页每60秒自动刷新一次")
+    if len(VOTE_IDS) > 1:
+        for vote_id in VOTE_IDS:
+            print(f"   {vote_title(vote_id)}: http://localhost:5000/vote/{vote_id}")
+    if not args.web_only:
+        if POLL_MODE == "http":
+            print(f"⚡ HTTP轮询模式：浏览器只负责登录，数据每{HTTP_POLL_INTERVAL}秒更新一次")
+        else:
+            print("⏰ 数据采集间隔根据票数变化自动调整")
+        if BROWSER_PROFILE == "lean":
+            print("🪶 精简浏览器模式：无头运行，不加载图片、字体和第三方脚本")
+        if PERSISTENT_SESSION:
+            print("♻️ 持久会话模式：浏览器常驻，刷新时只重新加载投票页面")
+    print("📡 网页通过SSE实时接收数据更新")
     
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    try:
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+    finally:
+        # 常驻的浏览器不会随Web服务器退出，Ctrl+C后在这里关掉
+        browser_pool.close_all()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file